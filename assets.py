@@ -0,0 +1,635 @@
+from PIL import Image, ImageStat, features
+from atlas import SpriteAtlas
+from thumbnails import read_thumbnail, render_thumbnail, scaled_size, write_thumbnail
+from rawcache import map_raw, raw_path, write_raw
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import subprocess
+import queue
+import threading
+import hashlib
+import json
+import time
+import os
+
+### Directory for generated cache files
+CACHE_DIR = ".cache"
+
+### Root of the image assets
+IMAGE_DIR = "images"
+
+### Packed sprites built by atlas.py
+ATLAS_PATH = os.path.join(CACHE_DIR, "sprites.atlas")
+sprite_atlas = SpriteAtlas(ATLAS_PATH)
+
+### Raw RGBA thumbnails built by thumbnails.py
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, "thumbs")
+
+### Raw RGBA copies of full-size decoded images
+RAW_DIR = os.path.join(CACHE_DIR, "raw")
+
+### Decoding backends in order of preference
+WEBP_BACKENDS = ("pillow", "dwebp")
+
+### Per-backend decode counters, used to measure render latency
+decode_stats = {backend: {"calls": 0, "seconds": 0.0} for backend in WEBP_BACKENDS}
+
+
+def _decode_pillow(file: str) -> Image:
+    """
+    Decode a webp file in-process with Pillow's native WebP plugin.
+
+    Args:
+        file (str): Path to webp file
+
+    Returns:
+        Image: PIL Image
+    """
+    with Image.open(file) as image:
+        image.load()
+        ### Detach from the file handle so it can be closed
+        return image.copy()
+
+
+def _decode_dwebp(file: str) -> Image:
+    """
+    Decode a webp file with the external dwebp binary.
+
+    Args:
+        file (str): Path to webp file
+
+    Raises:
+        Exception: If dwebp fails
+
+    Returns:
+        Image: PIL Image
+    """
+    webp = subprocess.run(
+        ["dwebp", file, "-quiet", "-o", "-"], capture_output=True
+    )
+    if webp.returncode != 0:
+        raise Exception(webp.stderr.decode())
+    return Image.open(BytesIO(webp.stdout))
+
+
+_DECODERS = {
+    "pillow": _decode_pillow,
+    "dwebp": _decode_dwebp,
+}
+
+
+def available_backends() -> list:
+    """
+    Get the webp decoding backends usable in this process.
+
+    Returns:
+        list[str]: Backend names in order of preference
+    """
+    backends = []
+    if features.check("webp"):
+        backends.append("pillow")
+    backends.append("dwebp")
+    return backends
+
+
+def dwebp(file: str, backend: str = None) -> Image:
+    """
+    Convert a webp file to a PIL Image.
+
+    Decodes in-process with Pillow when its WebP plugin is available and
+    falls back to the dwebp binary otherwise. The backend used is stored
+    in ``image.info["decoder"]`` and counted in ``decode_stats``.
+
+    Args:
+        file (str): Path to webp file
+        backend (str, optional): Force a backend. Defaults to None.
+
+    Raises:
+        Exception: If every backend fails
+
+    Returns:
+        Image: PIL Image
+    """
+    backends = [backend] if backend is not None else available_backends()
+
+    error = None
+    for name in backends:
+        start = time.perf_counter()
+        try:
+            image = _DECODERS[name](file)
+        except Exception as e:
+            error = e
+            continue
+        decode_stats[name]["calls"] += 1
+        decode_stats[name]["seconds"] += time.perf_counter() - start
+        image.info["decoder"] = name
+        return image
+
+    raise Exception(f"Could not decode {file}: {error}")
+
+
+def load_image(path: str, size: tuple = None) -> Image:
+    """
+    Load an image, memory-mapping its raw RGBA copy when it is fresh.
+    Otherwise decode it from the sprite atlas or the file, using dwebp()
+    for webp files, and write the raw copy for the next start.
+
+    Args:
+        path (str): Path to image file
+        size (tuple[int, int], optional): Pixel size of a thumbnail to load instead. Defaults to None.
+
+    Returns:
+        Image: PIL Image
+    """
+    if size is not None:
+        return load_thumbnail(path, size)
+
+    raw = raw_path(RAW_DIR, path)
+    image = map_raw(raw, path)
+    if image is not None:
+        return image
+
+    if path in sprite_atlas:
+        try:
+            image = sprite_atlas.image(path)
+        except OSError:
+            image = None
+    if image is None and path.lower().endswith(".webp"):
+        image = dwebp(path)
+    elif image is None:
+        with Image.open(path) as source:
+            source.load()
+            image = source.copy()
+
+    try:
+        write_raw(raw, path, image)
+    except OSError:
+        pass
+    return image
+
+
+def load_thumbnail(path: str, size: tuple) -> Image:
+    """
+    Load the thumbnail of an image, rendering and storing it if stale.
+
+    Args:
+        path (str): Path to image file
+        size (tuple[int, int]): Pixel size
+
+    Returns:
+        Image: RGBA PIL Image
+    """
+    image = read_thumbnail(THUMBNAIL_DIR, path, size)
+    if image is None:
+        image = render_thumbnail(image_cache.get(path), size)
+        try:
+            write_thumbnail(THUMBNAIL_DIR, path, image)
+        except OSError:
+            pass
+    return image
+
+
+class ImageCache:
+    """
+    Process-wide cache of decoded images keyed by path, mtime and
+    thumbnail size.
+
+    Entries are evicted least recently used first once the decoded size
+    of the cache exceeds ``max_bytes``. Cached images are shared between
+    callers and must not be modified in place.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, loader=load_image):
+        """
+        Initialize the ImageCache.
+
+        Args:
+            max_bytes (int, optional): Byte budget for decoded images. Defaults to 64 MiB.
+            loader (callable, optional): Function decoding a path and size to an Image. Defaults to load_image.
+        """
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_bytes(image: Image) -> int:
+        """
+        Get the decoded size of an image.
+
+        Args:
+            image (Image): PIL Image
+
+        Returns:
+            int: Size in bytes
+        """
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, path: str, size: tuple = None) -> Image:
+        """
+        Get the decoded image for a path, decoding it on a miss.
+
+        Args:
+            path (str): Path to image file
+            size (tuple[int, int], optional): Pixel size of a thumbnail to get instead. Defaults to None.
+
+        Returns:
+            Image: PIL Image
+        """
+        key = (path, os.stat(path).st_mtime_ns, size)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        image = self.loader(path, size)
+        self.put(key, image)
+        return image
+
+    def put(self, key: tuple, image: Image) -> None:
+        """
+        Store an image, dropping stale versions of the same path and size.
+
+        Args:
+            key (tuple[str, int, tuple | None]): Path, mtime and thumbnail size of the image
+            image (Image): PIL Image
+        """
+        size = self.image_bytes(image)
+        with self._lock:
+            for old in [
+                k for k in self._entries if k[0] == key[0] and k[2] == key[2]
+            ]:
+                self.current_bytes -= self.image_bytes(self._entries.pop(old))
+            self._entries[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self.image_bytes(evicted)
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Hits, misses, entries and bytes in use
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+### Shared cache used by every image load in the app
+image_cache = ImageCache()
+
+
+def average_rgb(image: Image) -> tuple:
+    """
+    Get the average RGB of the opaque pixels of an image.
+
+    Uses an alpha mask and Pillow's histogram statistics, so no pixel is
+    touched from Python.
+
+    Args:
+        image (Image): PIL Image
+
+    Returns:
+        tuple[int, int, int] | None: Average RGB, None if fully transparent
+    """
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+
+    ### Only count pixels that are not fully transparent
+    mask = image.getchannel("A").point(lambda a: 255 if a else 0)
+    stat = ImageStat.Stat(image, mask)
+    length = stat.count[0]
+
+    if length == 0:
+        return None
+
+    ### Return just the RGB
+    return tuple(round(stat.sum[band] / length) for band in range(3))
+
+
+def average_rgb_many(images: list) -> list:
+    """
+    Get the average RGB of many images in one call.
+
+    Args:
+        images (list[Image | str]): PIL Images or paths loaded through image_cache
+
+    Returns:
+        list[tuple[int, int, int] | None]: Average RGB of each image
+    """
+    return [
+        average_rgb(image_cache.get(image) if isinstance(image, str) else image)
+        for image in images
+    ]
+
+
+def image_paths(root: str = IMAGE_DIR) -> list:
+    """
+    Get every image file under a directory.
+
+    Args:
+        root (str, optional): Directory to walk. Defaults to images.
+
+    Returns:
+        list[str]: Sorted paths of the webp and png files
+    """
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith((".webp", ".png")):
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
+
+
+def file_digest(path: str) -> str:
+    """
+    Get the content hash of a file.
+
+    Args:
+        path (str): Path to file
+
+    Returns:
+        str: Hex sha1 digest
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class ColorIndex:
+    """
+    Persistent index of the average color of every image asset.
+
+    Entries are stored on disk keyed by path and revalidated by mtime and
+    size, falling back to the content hash when those change, so colors
+    are only recomputed for files whose pixels actually changed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, "colors.json")):
+        """
+        Initialize the ColorIndex.
+
+        Args:
+            path (str, optional): Path of the index file. Defaults to .cache/colors.json.
+        """
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def load(self) -> "ColorIndex":
+        """
+        Load the index file if it exists and matches the current version.
+
+        Returns:
+            ColorIndex: self
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == self.VERSION:
+            self.entries = data["entries"]
+        return self
+
+    def save(self) -> None:
+        """
+        Write the index file if any entry changed.
+        """
+        with self._lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(
+                    {"version": self.VERSION, "entries": self.entries},
+                    f,
+                    sort_keys=True,
+                )
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+    def is_fresh(self, path: str) -> bool:
+        """
+        Check whether the entry for a path matches the file's mtime and size.
+
+        Args:
+            path (str): Path to image file
+
+        Returns:
+            bool: True if the entry can be used as is
+        """
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        return (
+            entry is not None
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        )
+
+    def update(self, path: str, rgb: tuple, digest: str) -> None:
+        """
+        Store the color of a file computed elsewhere.
+
+        Args:
+            path (str): Path to image file
+            rgb (tuple[int, int, int] | None): Average RGB
+            digest (str): Hex sha1 digest of the file
+        """
+        stat = os.stat(path)
+        with self._lock:
+            self.entries[path] = {
+                "sha1": digest,
+                "rgb": list(rgb) if rgb else None,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+            }
+            self.dirty = True
+
+    def prune(self, root: str, paths: set) -> None:
+        """
+        Drop the entries under a directory for files that no longer exist.
+
+        Args:
+            root (str): Directory that was walked
+            paths (set[str]): Paths found under root
+        """
+        with self._lock:
+            for path in [p for p in self.entries if p.startswith(root) and p not in paths]:
+                del self.entries[path]
+                self.dirty = True
+
+    def _validate(self, path: str, compute) -> list:
+        """
+        Get the entry for a path, recomputing it if the file changed.
+
+        Args:
+            path (str): Path to image file
+            compute (callable): Returns the average RGB for the path
+
+        Returns:
+            list[int, int, int] | None: Average RGB
+        """
+        if not self.is_fresh(path):
+            entry = self.entries.get(path)
+            digest = file_digest(path)
+            if entry is None or entry["sha1"] != digest:
+                self.update(path, compute(path), digest)
+            else:
+                self.update(path, entry["rgb"], digest)
+        return self.entries[path]["rgb"]
+
+    def build(self, root: str = IMAGE_DIR, compute=None) -> "ColorIndex":
+        """
+        Bring every image under a directory up to date and save the index.
+
+        Args:
+            root (str, optional): Directory to walk. Defaults to images.
+            compute (callable, optional): Returns the average RGB for a path. Defaults to averaging the cached image.
+
+        Returns:
+            ColorIndex: self
+        """
+        compute = compute or (lambda p: average_rgb(image_cache.get(p)))
+        paths = image_paths(root)
+        for path in paths:
+            self._validate(path, compute)
+
+        ### Drop files that no longer exist
+        self.prune(root, set(paths))
+
+        self.save()
+        return self
+
+    def rgb(self, path: str) -> tuple:
+        """
+        Get the average RGB of an image, computing it only on a miss.
+
+        Args:
+            path (str): Path to image file
+
+        Returns:
+            tuple[int, int, int] | None: Average RGB
+        """
+        entry = self.entries.get(path)
+        if entry is not None:
+            rgb = entry["rgb"]
+        else:
+            rgb = self._validate(path, lambda p: average_rgb(image_cache.get(p)))
+        return tuple(rgb) if rgb else None
+
+
+### Shared color index, loaded from disk and revalidated at startup
+color_index = ColorIndex()
+
+
+class ImagePrefetcher:
+    """
+    Decode and color-average images on a worker pool ahead of rendering.
+
+    Workers only fill the thread-safe image_cache and color_index, with
+    the thumbnails at the size and scaling the UI will ask for. Paths
+    that finished loading are queued and handed to ``on_ready`` when the
+    UI thread calls poll(), so no Tk object is touched off the UI thread.
+    """
+
+    def __init__(self, workers: int = 4, on_ready=None):
+        """
+        Initialize the ImagePrefetcher.
+
+        Args:
+            workers (int, optional): Number of worker threads. Defaults to 4.
+            on_ready (callable, optional): Called with each loaded path from poll(). Defaults to None.
+        """
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="prefetch"
+        )
+        self._ready = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _load(self, path: str, size: tuple) -> None:
+        """
+        Load the thumbnail of an image and its color on a worker thread.
+
+        Args:
+            path (str): Path to image file
+            size (tuple[int, int]): Pixel size of the thumbnail
+        """
+        try:
+            image_cache.get(path, size)
+            color_index.rgb(path)
+        except Exception:
+            return
+        finally:
+            with self._lock:
+                self._pending.discard((path, size))
+        self._ready.put(path)
+
+    def prefetch(self, images: list, scale: int = 1) -> None:
+        """
+        Queue images for loading, skipping ones already in flight.
+
+        Args:
+            images (list[tuple[str, tuple[int, int]]]): Path and display size of each image
+            scale (int, optional): Scaling of the thumbnails. Defaults to 1.
+        """
+        for path, size in images:
+            pixel_size = scaled_size(size, scale)
+            with self._lock:
+                if (path, pixel_size) in self._pending:
+                    continue
+                self._pending.add((path, pixel_size))
+            self._executor.submit(self._load, path, pixel_size)
+
+    def poll(self) -> list:
+        """
+        Hand loaded paths to on_ready. Must be called from the UI thread.
+
+        Returns:
+            list[str]: Paths loaded since the last poll
+        """
+        ready = []
+        while True:
+            try:
+                ready.append(self._ready.get_nowait())
+            except queue.Empty:
+                break
+        if self.on_ready is not None:
+            for path in ready:
+                self.on_ready(path)
+        return ready
+
+    def shutdown(self) -> None:
+        """
+        Stop the workers, dropping queued work.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
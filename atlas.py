@@ -0,0 +1,164 @@
+from PIL import Image
+from io import BytesIO
+import argparse
+import json
+import mmap
+import time
+import os
+
+### Sprite folders packed into the atlas
+SPRITE_DIRS = ("items", "trait", "season")
+
+### Image files packed from those folders, matching assets.image_paths()
+SPRITE_EXTENSIONS = (".webp", ".png")
+
+
+def build_atlas(image_dir: str, atlas_path: str, sprite_dirs: tuple = SPRITE_DIRS) -> dict:
+    """
+    Pack the webp and png files of the sprite folders into one atlas
+    file plus an index of offsets.
+
+    The encoded bytes of each file are stored as they are, so the atlas
+    is no larger than the sprites and building it needs no decoding.
+
+    Args:
+        image_dir (str): Root of the image assets
+        atlas_path (str): Path of the atlas file, the index is written next to it
+        sprite_dirs (tuple[str], optional): Folders under image_dir to pack. Defaults to SPRITE_DIRS.
+
+    Returns:
+        dict: Index of path to offset, length, mtime and size
+    """
+    index = {}
+    os.makedirs(os.path.dirname(atlas_path) or ".", exist_ok=True)
+    tmp = f"{atlas_path}.tmp"
+    with open(tmp, "wb") as atlas:
+        for sprite_dir in sprite_dirs:
+            folder = os.path.join(image_dir, sprite_dir)
+            for name in sorted(os.listdir(folder)):
+                if not name.lower().endswith(SPRITE_EXTENSIONS):
+                    continue
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                with open(path, "rb") as f:
+                    data = f.read()
+                index[path] = {
+                    "offset": atlas.tell(),
+                    "length": len(data),
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                }
+                atlas.write(data)
+
+    with open(f"{tmp}.json", "w") as f:
+        json.dump(index, f, sort_keys=True)
+    os.replace(tmp, atlas_path)
+    os.replace(f"{tmp}.json", f"{atlas_path}.json")
+    return index
+
+
+class SpriteAtlas:
+    """
+    Memory-mapped sprite atlas built by build_atlas().
+
+    Sprites are sliced out of the mapping, so reading one needs no file
+    open. A sprite whose source file changed since the build is treated
+    as missing and left to the caller to load from disk.
+    """
+
+    def __init__(self, atlas_path: str):
+        """
+        Initialize the SpriteAtlas.
+
+        Args:
+            atlas_path (str): Path of the atlas file
+        """
+        self.atlas_path = atlas_path
+        self.index = {}
+        self._file = None
+        self._map = None
+
+    def open(self) -> "SpriteAtlas":
+        """
+        Map the atlas and load its index, if they exist.
+
+        Returns:
+            SpriteAtlas: self
+        """
+        self.close()
+        try:
+            with open(f"{self.atlas_path}.json") as f:
+                index = json.load(f)
+            self._file = open(self.atlas_path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.close()
+            return self
+        self.index = index
+        return self
+
+    def close(self) -> None:
+        """
+        Unmap the atlas.
+        """
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._map = None
+        self._file = None
+        self.index = {}
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.normpath(path) in self.index
+
+    def read(self, path: str) -> bytes:
+        """
+        Get the encoded bytes of a sprite.
+
+        Args:
+            path (str): Path of the sprite file
+
+        Returns:
+            bytes | None: Encoded sprite, None if missing or stale
+        """
+        entry = self.index.get(os.path.normpath(path))
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if stat.st_mtime_ns != entry["mtime_ns"] or stat.st_size != entry["size"]:
+            return None
+        return self._map[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def image(self, path: str) -> Image:
+        """
+        Decode a sprite from the atlas.
+
+        Args:
+            path (str): Path of the sprite file
+
+        Returns:
+            Image | None: PIL Image, None if missing or stale
+        """
+        data = self.read(path)
+        if data is None:
+            return None
+        with Image.open(BytesIO(data)) as image:
+            image.load()
+            return image.copy()
+
+
+if __name__ == "__main__":
+    from assets import ATLAS_PATH, IMAGE_DIR
+
+    parser = argparse.ArgumentParser(description="Build the sprite atlas")
+    parser.add_argument("--images", default=IMAGE_DIR, help="image asset root")
+    parser.add_argument("--output", default=ATLAS_PATH, help="atlas file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_atlas(args.images, args.output)
+    print(
+        f"Packed {len(index)} sprites into {args.output} "
+        f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
@@ -0,0 +1,319 @@
+from assets import average_rgb, average_rgb_many, image_cache
+from catalog import FILTER_LISTS, ItemIndex, build_records
+from query import Query, QueryEngine
+from search import FuzzyScorer, TextIndex, TypeaheadScorer, available_backends
+from fuzzywuzzy import fuzz
+from items import ITEM_DICT
+from PIL import Image
+from copy import deepcopy
+import tracemalloc
+import random
+import argparse
+import glob
+import time
+
+
+def timed(func, repeat: int = 5) -> float:
+    """
+    Get the best wall time of a function over several runs.
+
+    Args:
+        func (callable): Function to time
+        repeat (int, optional): Number of runs. Defaults to 5.
+
+    Returns:
+        float: Best time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _average_rgb_pixel_loop(image: Image) -> tuple:
+    """
+    Reference per-pixel implementation of average_rgb().
+
+    Args:
+        image (Image): PIL Image
+
+    Returns:
+        tuple[int, int, int] | None: Average RGB
+    """
+    rgba_list = []
+    for h in range(image.height):
+        for w in range(image.width):
+            var = image.getpixel((w, h))
+            if var[3] != 0:
+                rgba_list.append(var)
+    length = len(rgba_list)
+    if length == 0:
+        return None
+    return tuple(round(sum(p[band] for p in rgba_list) / length) for band in range(3))
+
+
+def bench_average_rgb() -> None:
+    """
+    Compare average_rgb() with the per-pixel loop on the item sprites.
+    """
+    images = [image_cache.get(path) for path in sorted(glob.glob("images/items/*.webp"))]
+    assert [_average_rgb_pixel_loop(i) for i in images] == average_rgb_many(images)
+
+    loop = timed(lambda: [_average_rgb_pixel_loop(i) for i in images], repeat=1)
+    single = timed(lambda: [average_rgb(i) for i in images])
+    batch = timed(lambda: average_rgb_many(images))
+    print(f"average_rgb on {len(images)} item sprites")
+    print(f"  pixel loop : {loop * 1000:8.2f} ms")
+    print(f"  vectorized : {single * 1000:8.2f} ms ({loop / single:.0f}x)")
+    print(f"  batch      : {batch * 1000:8.2f} ms ({loop / batch:.0f}x)")
+
+
+def scaled_catalog(factor: int) -> dict:
+    """
+    Get a catalog made of copies of ITEM_DICT under new keys.
+
+    Args:
+        factor (int): Number of copies
+
+    Returns:
+        dict: Scaled catalog
+    """
+    return {
+        f"{key}{copy}": value
+        for copy in range(factor)
+        for key, value in ITEM_DICT.items()
+    }
+
+
+def bench_item_index() -> None:
+    """
+    Time filter queries on the item index at 1x and 1000x catalog size,
+    compiled from scratch and answered from the plan cache.
+    """
+    filters = {"season": "Spring w2", "tool": "Master+", "weather": "Sunny"}
+    for factor in (1, 1000):
+        records = build_records(scaled_catalog(factor))
+        start = time.perf_counter()
+        index = ItemIndex(records)
+        build = time.perf_counter() - start
+
+        def cold():
+            index.plans.clear()
+            index.unions.clear()
+            return index.query(filters)
+
+        compiled = timed(cold, repeat=100)
+        cached = timed(lambda: index.query(filters), repeat=100)
+        print(f"item index on {len(index.keys)} items")
+        print(f"  build  : {build * 1000:8.2f} ms")
+        print(f"  cold   : {compiled * 1000:8.4f} ms")
+        print(f"  cached : {cached * 1000:8.4f} ms")
+
+
+def allocated(func) -> int:
+    """
+    Get the peak bytes allocated while running a function.
+
+    Args:
+        func (callable): Function to measure
+
+    Returns:
+        int: Peak traced bytes
+    """
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def bench_query_views() -> None:
+    """
+    Compare copying query results with sharing read-only records, on
+    normal items and on items with 1000x larger payloads.
+    """
+    heavy = {
+        key: dict(value, location=value["location"] * 1000)
+        for key, value in ITEM_DICT.items()
+    }
+    filters = {"gatherable_type": "Growing"}
+    for label, item_dict in (("normal", ITEM_DICT), ("heavy", heavy)):
+        records = build_records(item_dict)
+        index = ItemIndex(records)
+        keys = index.compile(filters).keys
+
+        def copied():
+            return {key: deepcopy(item_dict[key]) for key in keys}
+
+        def shared():
+            return {key: records[key] for key in keys}
+
+        print(f"query results on {label} items ({len(keys)} results)")
+        for name, func in (("deepcopy", copied), ("views", shared)):
+            print(
+                f"  {name:<9}: {timed(func) * 1000:8.3f} ms "
+                f"{allocated(func) / 1024:10.1f} KiB peak"
+            )
+
+
+def sample_queries(count: int) -> list:
+    """
+    Get a reproducible mix of filter and search queries.
+
+    Args:
+        count (int): Number of queries
+
+    Returns:
+        list[Query]: Queries
+    """
+    rng = random.Random(0)
+    names = list(ITEM_DICT)
+    queries = []
+    for _ in range(count):
+        dimension = rng.choice(list(FILTER_LISTS))
+        filters = {dimension: rng.choice(FILTER_LISTS[dimension])[0]}
+        name = rng.choice(names)
+        search = name[: rng.randint(0, len(name))]
+        queries.append(Query.make(filters, search))
+    return queries
+
+
+def bench_query_engine() -> None:
+    """
+    Time the headless query engine one query at a time and in batches.
+    """
+    queries = sample_queries(500)
+
+    def run_each():
+        engine = QueryEngine()
+        return [engine.run(q) for q in queries]
+
+    sequential = timed(run_each, repeat=3)
+    batch = timed(lambda: QueryEngine().run_batch(queries), repeat=3)
+    assert run_each() == QueryEngine().run_batch(queries)
+    print(f"query engine on {len(queries)} queries")
+    print(f"  run       : {sequential * 1000:8.2f} ms")
+    print(f"  run_batch : {batch * 1000:8.2f} ms")
+
+
+def _rank_two_pass(keys: list, search: str) -> tuple:
+    """
+    Reference ranking scoring every key twice, as the search path used to.
+
+    Args:
+        keys (list[str]): Item keys
+        search (str): Search text
+
+    Returns:
+        tuple[str]: Keys above the threshold, best match first
+    """
+    keys = sorted(keys, key=lambda k: fuzz.ratio(search.lower(), k.lower()), reverse=True)
+    return tuple(k for k in keys if fuzz.ratio(search.lower(), k.lower()) > 50)
+
+
+def sample_searches(keys: list, count: int) -> list:
+    """
+    Get a reproducible mix of partial item names and random text.
+
+    Args:
+        keys (list[str]): Item keys
+        count (int): Number of searches
+
+    Returns:
+        list[str]: Searches
+    """
+    rng = random.Random(0)
+    searches = []
+    for _ in range(count):
+        name = rng.choice(keys)
+        searches.append(name[: rng.randint(1, len(name))])
+    return searches
+
+
+def bench_search() -> None:
+    """
+    Time fuzzy ranking with every available backend against the two-pass
+    reference, at 1x and 20x catalog size, and count the items left to
+    score by the trigram index at several thresholds.
+    """
+    for factor in (1, 20):
+        keys = list(scaled_catalog(factor))
+        searches = sample_searches(keys, 20)
+        reference = timed(lambda: [_rank_two_pass(keys, s) for s in searches], repeat=1)
+        print(f"fuzzy search on {len(keys)} items ({len(searches)} searches)")
+        print(f"  {'two-pass':<10}: {reference * 1000:8.2f} ms")
+        for backend in available_backends():
+            scorer = FuzzyScorer(backend)
+            seconds = timed(lambda: [scorer.rank(keys, s) for s in searches], repeat=3)
+            print(f"  {backend:<10}: {seconds * 1000:8.2f} ms ({reference / seconds:.1f}x)")
+        for threshold in (50, 80, 90):
+            scorer = FuzzyScorer(threshold=threshold)
+            names = [scorer.name(key) for key in keys]
+            scored = sum(
+                len(scorer.trigram_index.shortlist(s.lower(), names, threshold)) for s in searches
+            )
+            print(f"  scored at threshold {threshold}: {scored / len(searches) / len(keys):6.1%} of items")
+
+
+def bench_typeahead() -> None:
+    """
+    Time ranking after every keystroke of typed searches, scoring from
+    scratch and with the typeahead state, at 1x and 20x catalog size.
+    """
+    for factor in (1, 20):
+        keys = list(scaled_catalog(factor))
+        ### Type each search, then erase it down to its first character
+        keystrokes = []
+        for search in sample_searches(keys, 10):
+            keystrokes += [search[:i] for i in range(1, len(search) + 1)]
+            keystrokes += [search[:i] for i in range(len(search) - 1, 0, -1)]
+        print(f"typeahead on {len(keys)} items ({len(keystrokes)} keystrokes)")
+        for backend in available_backends():
+            fresh, typeahead = FuzzyScorer(backend), TypeaheadScorer(backend)
+            assert [fresh.rank(keys, k) for k in keystrokes] == [
+                typeahead.rank(keys, k) for k in keystrokes
+            ]
+            for label, scorer in (("fresh", fresh), ("typeahead", typeahead)):
+                seconds = timed(lambda: [scorer.rank(keys, k) for k in keystrokes], repeat=1)
+                print(f"  {backend:<10} {label:<9}: {seconds / len(keystrokes) * 1000:8.3f} ms per keystroke")
+
+
+def bench_text_index() -> None:
+    """
+    Time building the text index and answering each keystroke of typed
+    location and trait searches, at 1x and 20x catalog size.
+    """
+    searches = ["Frogmarsh", "The Twanging Gardens", "Flatulent", "Sunny Dawn"]
+    keystrokes = [search[:i] for search in searches for i in range(1, len(search) + 1)]
+    for factor in (1, 20):
+        records = build_records(scaled_catalog(factor))
+        keys = list(records)
+        start = time.perf_counter()
+        index = TextIndex(records)
+        build = time.perf_counter() - start
+        seconds = timed(lambda: [index.rank(keys, k) for k in keystrokes], repeat=3)
+        print(f"text index on {len(keys)} items ({len(index.terms)} terms)")
+        print(f"  build : {build * 1000:8.2f} ms")
+        print(f"  query : {seconds / len(keystrokes) * 1000:8.3f} ms per keystroke")
+
+
+BENCHMARKS = {
+    "average_rgb": bench_average_rgb,
+    "item_index": bench_item_index,
+    "query_views": bench_query_views,
+    "query_engine": bench_query_engine,
+    "search": bench_search,
+    "typeahead": bench_typeahead,
+    "text_index": bench_text_index,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kynseed Rating benchmarks")
+    parser.add_argument("names", nargs="*", help=f"any of {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    for name in args.names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+        BENCHMARKS[name]()
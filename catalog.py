@@ -0,0 +1,642 @@
+from items import ITEM_DICT
+from types import MappingProxyType
+from typing import NamedTuple
+from bisect import bisect_left, bisect_right
+import re
+from lists import (
+    TOOL_QUALITY_LIST,
+    FOLLOWER_LIST,
+    GATHER_TYPE_LIST,
+    WEATHER_LIST,
+    TRAIT_LIST,
+    SEASON_LIST,
+    TIME_LIST,
+    PRICE_STAR_LIST,
+)
+
+### Filter dimensions and the values each one can take
+FILTER_LISTS = {
+    "gatherable_type": GATHER_TYPE_LIST,
+    "tool": TOOL_QUALITY_LIST,
+    "follower": FOLLOWER_LIST,
+    "weather": WEATHER_LIST,
+    "trait": TRAIT_LIST,
+    "season": SEASON_LIST,
+    "time": TIME_LIST,
+}
+
+### Tool tiers from worst to best
+TOOL_TIERS = [i[0] for i in TOOL_QUALITY_LIST]
+
+### Star levels of the price list
+PRICE_STARS = [i[0] for i in PRICE_STAR_LIST]
+
+### Every price found in ITEM_DICT, for the price range filters
+PRICE_LIST = [
+    (str(price), None)
+    for price in sorted({p for item in ITEM_DICT.values() for p in item["price"]})
+]
+
+### Filters answered by bisecting ordinal indexes instead of bitsets
+RANGE_FILTERS = ("tool_min", "price_stars", "price_min", "price_max")
+
+### Filters accepting several values, matched if any of them matches
+MULTI_FILTERS = tuple(FILTER_LISTS)
+
+
+def separate_pascal_case(string: str) -> str:
+    """
+    Separate a pascal case string into words.
+    Example:
+        separate_pascal_case("PascalCase") -> "Pascal Case"
+
+    Args:
+        string (str): Pascal case string
+
+    Returns:
+        str: Separated string
+    """
+    return ' '.join(re.findall(r'[A-Z][^A-Z]*', string))
+
+
+class Season(NamedTuple):
+    """
+    Season value split into its base season and week, 0 for the whole season.
+    """
+
+    name: str
+    base: str
+    week: int
+
+
+class ItemRecord(NamedTuple):
+    """
+    Normalized, read-only entry of ITEM_DICT.
+
+    Every quality and spawn value is a frozenset, whether ITEM_DICT holds
+    a single string or a set, so consumers never branch on the type. The
+    quality and spawn mappings are read-only views, so records can be
+    shared by reference instead of copied.
+    """
+
+    key: str
+    name: str
+    gatherable_type: str
+    quality: dict
+    spawn: dict
+    seasons: tuple
+    spawn_seasons: tuple
+    tool_tier: int
+    location: tuple
+    price: tuple
+
+
+def parse_season(season: str) -> Season:
+    """
+    Split a season value into base and week.
+    Example:
+        parse_season("Spring w2") -> Season("Spring w2", "Spring", 2)
+
+    Args:
+        season (str): Season value
+
+    Returns:
+        Season: Parsed season
+    """
+    base, _, week = season.partition(" w")
+    return Season(season, base, int(week) if week.isdigit() else 0)
+
+
+def _normalize(values: dict) -> MappingProxyType:
+    """
+    Turn every value of a quality or spawn dict into a frozenset.
+
+    Args:
+        values (dict): Quality or spawn dict of an item
+
+    Returns:
+        MappingProxyType[str, frozenset[str]]: Read-only normalized dict in the same order
+    """
+    return MappingProxyType({
+        field: frozenset(val) if type(val) == set else frozenset([val])
+        for field, val in values.items()
+    })
+
+
+def make_record(key: str, item: dict) -> ItemRecord:
+    """
+    Build the normalized record of an ITEM_DICT entry.
+
+    Args:
+        key (str): Item key
+        item (dict): Entry of ITEM_DICT
+
+    Returns:
+        ItemRecord: Normalized record
+    """
+    quality = _normalize(item["quality"])
+    spawn = _normalize(item.get("spawn", {}))
+    tool = item["quality"].get("tool")
+    return ItemRecord(
+        key=key,
+        name=separate_pascal_case(key),
+        gatherable_type=item["gatherable_type"],
+        quality=quality,
+        spawn=spawn,
+        seasons=tuple(sorted(parse_season(s) for s in quality.get("season", ()))),
+        spawn_seasons=tuple(sorted(parse_season(s) for s in spawn.get("season", ()))),
+        tool_tier=TOOL_TIERS.index(tool) if tool in TOOL_TIERS else -1,
+        location=tuple(item["location"]),
+        price=tuple(item["price"]),
+    )
+
+
+def build_records(item_dict: dict) -> MappingProxyType:
+    """
+    Build the read-only normalized records of a catalog.
+
+    Args:
+        item_dict (dict): Catalog shaped like ITEM_DICT
+
+    Returns:
+        MappingProxyType[str, ItemRecord]: Records in catalog order
+    """
+    return MappingProxyType(
+        {key: make_record(key, item) for key, item in item_dict.items()}
+    )
+
+
+### Normalized records of ITEM_DICT built at import
+ITEM_RECORDS = build_records(ITEM_DICT)
+
+
+def item_values(record: ItemRecord, dimension: str) -> frozenset:
+    """
+    Get the values an item has for a filter dimension.
+
+    Args:
+        record (ItemRecord): Item record
+        dimension (str): Filter dimension
+
+    Returns:
+        frozenset[str]: Values of the item, empty if it has none
+    """
+    if dimension == "gatherable_type":
+        return frozenset([record.gatherable_type])
+    return record.quality.get(dimension, frozenset())
+
+
+### Weather that breaks a Not Rain condition
+RAIN_WEATHER = ("Rain",)
+
+
+def _accepts(dimension: str, selected: str, value: str) -> bool:
+    """
+    Decide whether a selected filter value accepts an item value.
+
+    Only used to build COMPATIBILITY, lookups go through the table.
+
+    Args:
+        dimension (str): Filter dimension
+        selected (str): Value selected in the filter
+        value (str): Value of the item
+
+    Returns:
+        bool: True if the item value passes the filter
+    """
+    if selected == value:
+        return True
+
+    ### Seasons with a week accept every value of their season (Spring w2 vs Spring)
+    if dimension == "season":
+        selected_season, value_season = parse_season(selected), parse_season(value)
+        return selected_season.week > 0 and selected_season.base == value_season.base
+    ### TOOLS, any tool at or below the selected tier
+    if dimension == "tool":
+        return (
+            value in TOOL_TIERS
+            and selected in TOOL_TIERS
+            and TOOL_TIERS.index(value) < TOOL_TIERS.index(selected)
+        )
+    ### Times sharing a part (Dawn/Dusk vs Dawn)
+    if dimension == "time":
+        return bool(set(selected.split("/")) & set(value.split("/")))
+    ### Logic for Not Rain
+    if dimension == "weather":
+        return value == "Not Rain" and selected not in RAIN_WEATHER
+    return False
+
+
+def build_compatibility(filter_lists: dict = FILTER_LISTS) -> MappingProxyType:
+    """
+    Build the table of the item values each filter value accepts.
+
+    Args:
+        filter_lists (dict, optional): Values of each filter dimension. Defaults to FILTER_LISTS.
+
+    Returns:
+        MappingProxyType[str, dict[str, frozenset[str]]]: Accepted values of each selected value of each dimension
+    """
+    table = {}
+    for dimension, option_list in filter_lists.items():
+        options = [i[0] for i in option_list]
+        table[dimension] = MappingProxyType({
+            selected: frozenset(value for value in options if _accepts(dimension, selected, value))
+            for selected in options
+        })
+    return MappingProxyType(table)
+
+
+### Season week, tool tier, time and weather relations resolved once at import
+COMPATIBILITY = build_compatibility()
+
+
+def accepted_values(dimension: str, selected: str) -> frozenset:
+    """
+    Get the item values a selected filter value accepts.
+
+    Args:
+        dimension (str): Filter dimension
+        selected (str): Value selected in the filter
+
+    Returns:
+        frozenset[str]: Accepted item values, the selected value alone if it is not a known option
+    """
+    accepted = COMPATIBILITY.get(dimension, {}).get(selected)
+    return frozenset([selected]) if accepted is None else accepted
+
+
+def filter_matches(dimension: str, selected: str, value: str) -> bool:
+    """
+    Check whether a selected filter value accepts an item value.
+
+    Args:
+        dimension (str): Filter dimension
+        selected (str): Value selected in the filter
+        value (str): Value of the item
+
+    Returns:
+        bool: True if the item value passes the filter
+    """
+    return value in accepted_values(dimension, selected)
+
+
+def normalize_selection(selected):
+    """
+    Get the canonical form of the values selected in a filter.
+    Example:
+        normalize_selection(["Summer", "Spring"]) -> ("Spring", "Summer")
+        normalize_selection(["Spring"]) -> "Spring"
+
+    Args:
+        selected (str | iterable[str]): Selected value or values
+
+    Returns:
+        str | tuple[str]: The value itself if only one, sorted distinct values otherwise
+    """
+    if isinstance(selected, str):
+        return selected
+    values = tuple(sorted(set(selected)))
+    return values[0] if len(values) == 1 else values
+
+
+def selection_values(selected) -> frozenset:
+    """
+    Get the values selected in a filter as a set.
+
+    Args:
+        selected (str | iterable[str]): Selected value or values
+
+    Returns:
+        frozenset[str]: Selected values
+    """
+    if isinstance(selected, str):
+        return frozenset([selected])
+    return frozenset(selected)
+
+
+def normalize_filters(filters: dict) -> tuple:
+    """
+    Get the canonical, hashable form of a filter selection.
+
+    Args:
+        filters (dict[str, str | iterable[str]]): Selected value or values of each active filter
+
+    Returns:
+        tuple[tuple[str, str | tuple[str]]]: Sorted filter pairs
+    """
+    return tuple(
+        sorted((dimension, normalize_selection(selected)) for dimension, selected in filters.items())
+    )
+
+
+class OrdinalIndex:
+    """
+    Items sorted by an ordinal value, for range queries by bisection.
+
+    A bitset of the items below each distinct value is kept, so a range
+    costs two bisections over the distinct values and one intersection,
+    whatever the number of items.
+    """
+
+    def __init__(self, values: dict, bitset):
+        """
+        Initialize the OrdinalIndex.
+
+        Args:
+            values (dict[int, int]): Ordinal value of each indexed item id
+            bitset (callable): Builds a bitset from item ids
+        """
+        holders = {}
+        for item_id, value in values.items():
+            holders.setdefault(value, []).append(item_id)
+        self.values = sorted(holders)
+
+        ### below[i] holds the items whose value is lower than values[i]
+        self.below = [0]
+        for value in self.values:
+            self.below.append(self.below[-1] | bitset(holders[value]))
+
+    def range(self, low: int = None, high: int = None) -> int:
+        """
+        Get the items whose value lies between two bounds, inclusive.
+
+        Args:
+            low (int, optional): Lowest value, unbounded if None. Defaults to None.
+            high (int, optional): Highest value, unbounded if None. Defaults to None.
+
+        Returns:
+            int: Bitset of item ids
+        """
+        start = 0 if low is None else bisect_left(self.values, low)
+        stop = len(self.values) if high is None else bisect_right(self.values, high)
+        if start >= stop:
+            return 0
+        return self.below[stop] & ~self.below[start]
+
+
+class FilterPlan:
+    """
+    Compiled form of a filter selection.
+
+    ``steps`` lists the bitsets in the order they are intersected, most
+    selective first, with the number of items each one keeps. ``keys`` is
+    only built when first read, so compiling costs the intersections alone.
+    """
+
+    def __init__(self, filters: tuple, steps: tuple, mask: int, keys_of):
+        """
+        Initialize the FilterPlan.
+
+        Args:
+            filters (tuple): Normalized filter selection
+            steps (tuple[tuple[str, str, int]]): Dimension, selection and item count of each step
+            mask (int): Bitset of the matching item ids
+            keys_of (callable): Gets the item keys of a bitset
+        """
+        self.filters = filters
+        self.steps = steps
+        self.mask = mask
+        self._keys_of = keys_of
+        self._keys = None
+
+    @property
+    def keys(self) -> tuple:
+        """
+        Get the keys of the matching items in item order.
+
+        Returns:
+            tuple[str]: Item keys
+        """
+        if self._keys is None:
+            self._keys = tuple(self._keys_of(self.mask))
+        return self._keys
+
+    def explain(self) -> str:
+        """
+        Describe the plan for debugging.
+
+        Returns:
+            str: One line per intersection step
+        """
+        lines = [f"FilterPlan {dict(self.filters)} -> {self.mask.bit_count()} items"]
+        for dimension, selected, count in self.steps:
+            lines.append(f"  & {dimension} = {selected!r} ({count} items)")
+        return "\n".join(lines)
+
+
+class ItemIndex:
+    """
+    Inverted index from each filter value to a bitset of item ids.
+
+    Item ids are positions in ITEM_RECORDS, so a query is the intersection
+    of one bitset per active filter and its set bits come out in the
+    original item order. Season weeks, tool tiers, times and Not Rain are
+    resolved from COMPATIBILITY while building the bitsets. A filter
+    holding several values is the union of their bitsets, built once per
+    distinct selection and kept with the plans.
+    """
+
+    def __init__(self, records: dict = ITEM_RECORDS, filter_lists: dict = FILTER_LISTS, max_plans: int = 1024):
+        """
+        Initialize the ItemIndex.
+
+        Args:
+            records (dict, optional): Item records to index. Defaults to ITEM_RECORDS.
+            filter_lists (dict, optional): Values of each filter dimension. Defaults to FILTER_LISTS.
+            max_plans (int, optional): Number of compiled plans kept. Defaults to 1024.
+        """
+        self.max_plans = max_plans
+        self.plans = {}
+        self.unions = {}
+        self.keys = list(records)
+        self.all_items = (1 << len(self.keys)) - 1
+        self.bitsets = {}
+        for dimension, option_list in filter_lists.items():
+            options = [i[0] for i in option_list]
+            ### Item ids holding each distinct value
+            holder_ids = {}
+            for item_id, key in enumerate(self.keys):
+                for value in item_values(records[key], dimension):
+                    holder_ids.setdefault(value, []).append(item_id)
+            holders = {
+                value: self.bitset(ids) for value, ids in holder_ids.items()
+            }
+            self.bitsets[dimension] = {
+                selected: self._union(
+                    holders.get(value, 0)
+                    for value in accepted_values(dimension, selected)
+                )
+                for selected in options
+            }
+
+        ### Ordinal indexes over the tool tier and each star level of the price
+        self.tool_tiers = OrdinalIndex(
+            {
+                item_id: records[key].tool_tier
+                for item_id, key in enumerate(self.keys)
+                if records[key].tool_tier >= 0
+            },
+            self.bitset,
+        )
+        self.prices = [
+            OrdinalIndex(
+                {
+                    item_id: records[key].price[stars]
+                    for item_id, key in enumerate(self.keys)
+                    if len(records[key].price) > stars
+                },
+                self.bitset,
+            )
+            for stars in range(len(PRICE_STARS))
+        ]
+
+    def bitset(self, item_ids) -> int:
+        """
+        Get the bitset of item ids.
+
+        Args:
+            item_ids (iterable[int]): Item ids
+
+        Returns:
+            int: Bitset of item ids
+        """
+        bits = bytearray(len(self.keys) // 8 + 1)
+        for item_id in item_ids:
+            bits[item_id >> 3] |= 1 << (item_id & 7)
+        return int.from_bytes(bits, "little")
+
+    @staticmethod
+    def _union(masks) -> int:
+        """
+        Get the union of bitsets.
+
+        Args:
+            masks (iterable[int]): Bitsets
+
+        Returns:
+            int: Union of the bitsets
+        """
+        union = 0
+        for mask in masks:
+            union |= mask
+        return union
+
+    def selection(self, dimension: str, selected) -> int:
+        """
+        Get the items accepted by any of the values selected in a filter.
+
+        Args:
+            dimension (str): Filter dimension
+            selected (str | tuple[str]): Normalized selection
+
+        Returns:
+            int: Bitset of item ids
+        """
+        bitsets = self.bitsets[dimension]
+        if isinstance(selected, str):
+            return bitsets.get(selected, 0)
+        key = (dimension, selected)
+        union = self.unions.get(key)
+        if union is None:
+            union = self._union(bitsets.get(value, 0) for value in selected)
+            if len(self.unions) >= self.max_plans:
+                del self.unions[next(iter(self.unions))]
+            self.unions[key] = union
+        return union
+
+    def compile(self, filters: dict) -> FilterPlan:
+        """
+        Compile a filter selection into a plan, reusing a cached one.
+
+        Args:
+            filters (dict[str, str | iterable[str]]): Selected value or values of each active filter
+
+        Returns:
+            FilterPlan: Plan holding the matching items
+        """
+        key = normalize_filters(filters)
+        plan = self.plans.get(key)
+        if plan is not None:
+            return plan
+        filters = dict(key)
+
+        ### Union within a dimension, intersection across dimensions
+        steps = [
+            (dimension, selected, self.selection(dimension, selected))
+            for dimension, selected in key
+            if dimension not in RANGE_FILTERS
+        ]
+        if "tool_min" in filters:
+            steps.append(
+                (
+                    "tool_min",
+                    filters["tool_min"],
+                    self.tool_tiers.range(low=TOOL_TIERS.index(filters["tool_min"])),
+                )
+            )
+        if "price_min" in filters or "price_max" in filters:
+            stars = PRICE_STARS.index(filters.get("price_stars", PRICE_STARS[0]))
+            low, high = filters.get("price_min"), filters.get("price_max")
+            steps.append(
+                (
+                    "price",
+                    f"{low or ''}..{high or ''} at {PRICE_STARS[stars]}",
+                    self.prices[stars].range(
+                        None if low is None else int(low),
+                        None if high is None else int(high),
+                    ),
+                )
+            )
+
+        ### Intersect the smallest bitsets first so empty results stop early
+        bitsets = sorted(
+            (bitset.bit_count(), dimension, selected, bitset)
+            for dimension, selected, bitset in steps
+        )
+        mask = self.all_items
+        for _, _, _, bitset in bitsets:
+            mask &= bitset
+            if not mask:
+                break
+
+        plan = FilterPlan(
+            filters=key,
+            steps=tuple((dimension, selected, count) for count, dimension, selected, _ in bitsets),
+            mask=mask,
+            keys_of=self.keys_of,
+        )
+        if len(self.plans) >= self.max_plans:
+            del self.plans[next(iter(self.plans))]
+        self.plans[key] = plan
+        return plan
+
+    def query(self, filters: dict) -> int:
+        """
+        Get the items passing every filter.
+
+        Args:
+            filters (dict[str, str | iterable[str]]): Selected value or values of each active filter
+
+        Returns:
+            int: Bitset of item ids
+        """
+        return self.compile(filters).mask
+
+    def keys_of(self, mask: int) -> list:
+        """
+        Get the item keys of a bitset in item order.
+
+        Args:
+            mask (int): Bitset of item ids
+
+        Returns:
+            list[str]: Item keys
+        """
+        ### Read the bits lowest first from the binary string
+        bits = bin(mask)[:1:-1]
+        return [self.keys[i] for i, bit in enumerate(bits) if bit == "1"]
+
+
+### Index over ITEM_DICT built at load time
+item_index = ItemIndex()
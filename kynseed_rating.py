@@ -1,4 +1,4 @@
-from items import ITEM_DICT
+from catalog import ITEM_RECORDS, MULTI_FILTERS, PRICE_LIST
 from lists import (
     TOOL_QUALITY_LIST,
     FOLLOWER_LIST,
@@ -7,90 +7,26 @@ from lists import (
     TRAIT_LIST,
     SEASON_LIST,
     TIME_LIST,
+    PRICE_STAR_LIST,
     OPTION_MENU,
 )
+from thumbnails import scaled_size
+from query import Query, QueryEngine
+from search import TypeaheadScorer, fuzzy_scorer, text_index
+from scheduler import RefreshScheduler
 import tkinter as tk
 import customtkinter as ctk
-from fuzzywuzzy import fuzz
 from PIL import Image
-from copy import deepcopy
-from io import BytesIO
-import subprocess
-import re
+from assets import (
+    image_cache,
+    color_index,
+    sprite_atlas,
+    ImagePrefetcher,
+)
 
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("dark-blue")
 
-def separate_pascal_case(string: str) -> str:
-    """
-    Separate a pascal case string into words.
-    Example:
-        separate_pascal_case("PascalCase") -> "Pascal Case"
-
-    Args:
-        string (str): Pascal case string
-
-    Returns:
-        str: Separated string
-    """
-    return ' '.join(re.findall(r'[A-Z][^A-Z]*', string))
-
-def dwebp(file: str) -> Image:
-    """
-    Convert a webp file to a PIL Image.
-    Args:
-        file (str): Path to webp file
-
-    Raises:
-        Exception: If dwebp fails
-
-    Returns:
-        _type_: PIL Image
-    """
-    webp = subprocess.run(f"dwebp {file} -quiet -o -", shell=True, capture_output=True)
-    if webp.returncode != 0:
-        raise Exception(webp.stderr.decode())
-    else:
-        return Image.open(BytesIO(webp.stdout))
-
-
-def average_rgb(image: Image) -> tuple:
-    """
-    Get the average RGBA of an image.
-
-    Args:
-        image (Image): PIL Image
-
-    Returns:
-        tuple[float, float, float]: Average RGB
-    """
-    ### Remove transparent
-    rgba_list = []
-    for h in range(image.height):
-        for w in range(image.width):
-            var = image.getpixel((w, h))
-            if var[3] != 0:
-                rgba_list.append(var)
-
-    ### Get average RGBA
-    r_total = 0
-    g_total = 0
-    b_total = 0
-    a_total = 0
-    for rgba in rgba_list:
-        r_total += rgba[0]
-        g_total += rgba[1]
-        b_total += rgba[2]
-        a_total += rgba[3]
-    length = len(rgba_list)
-    
-    if length == 0:
-        return None
-    
-    ### Return just the RGB
-    return round(r_total / length), round(g_total / length), round(b_total / length)
-
-
 def rgb_to_hex(rgb: tuple) -> str:
     """
     Convert an RGB tuple to a hex string.
@@ -121,6 +57,70 @@ def complementary_color(my_hex: str) -> str:
     return "#" + "".join(comp)
 
 
+class CTkImageRegistry:
+    """
+    Reuse CTkImage wrappers keyed by source path and display size.
+
+    Sources are thumbnails pre-rendered at the display size, at 2x for
+    scalings above 1. An entry is released once it has not been used for
+    ``keep_renders`` renders, or rebuilt when image_cache hands back a new
+    source image because the file changed.
+    """
+
+    def __init__(self, keep_renders: int = 2):
+        """
+        Initialize the CTkImageRegistry.
+
+        Args:
+            keep_renders (int, optional): Renders an unused entry survives. Defaults to 2.
+        """
+        self.keep_renders = keep_renders
+        self.scale = 1
+        self.render = 0
+        self.created = 0
+        self.reused = 0
+        self._entries = {}
+
+    def begin_render(self, scaling: float = 1.0) -> None:
+        """
+        Start a new render and release the entries that fell out of use.
+
+        Args:
+            scaling (float, optional): Current widget scaling. Defaults to 1.0.
+        """
+        self.scale = 2 if scaling > 1 else 1
+        self.render += 1
+        for key in [
+            key
+            for key, (_, _, last_used) in self._entries.items()
+            if self.render - last_used > self.keep_renders
+        ]:
+            del self._entries[key]
+
+    def get(self, path: str, size: tuple) -> ctk.CTkImage:
+        """
+        Get the CTkImage for an image at a display size.
+
+        Args:
+            path (str): Path to image file
+            size (tuple[int, int]): Display size
+
+        Returns:
+            ctk.CTkImage: Shared CTkImage
+        """
+        source = image_cache.get(path, scaled_size(size, self.scale))
+        key = (path, size, self.scale)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is source:
+            self.reused += 1
+            ctk_image = entry[0]
+        else:
+            self.created += 1
+            ctk_image = ctk.CTkImage(source, size=size)
+        self._entries[key] = (ctk_image, source, self.render)
+        return ctk_image
+
+
 class App(ctk.CTk):
     def __init__(self):
         """
@@ -154,9 +154,8 @@ class App(ctk.CTk):
         )
 
         ### Create the image icons
-        self.reverse_icon = ctk.CTkImage(
-            Image.open("images/reverse.png"), size=(20, 20)
-        )
+        self.image_registry = CTkImageRegistry()
+        self.reverse_icon = self.image_registry.get("images/reverse.png", (20, 20))
 
         ### Filter title
         self.filter_title = ctk.CTkLabel(
@@ -173,8 +172,9 @@ class App(ctk.CTk):
             height=20,
         )
 
-        ### cache for colors
-        self.color_cache = {}
+        ### Map the sprite atlas and load the precomputed colors of every image
+        sprite_atlas.open()
+        color_index.load().build()
 
         reverse.grid(row=0, column=1, padx=5, pady=(10, 10))
 
@@ -189,10 +189,16 @@ class App(ctk.CTk):
             "trait": {"option_list": TRAIT_LIST,},
             "season": {"option_list": SEASON_LIST},
             "time": {"option_list": TIME_LIST},
+            "tool_min": {"option_list": TOOL_QUALITY_LIST},
+            "price_stars": {"option_list": PRICE_STAR_LIST},
+            "price_min": {"option_list": PRICE_LIST},
+            "price_max": {"option_list": PRICE_LIST},
         }
         for key in self.dict_filter.keys():
+            ### Values currently selected in the filter
+            self.dict_filter[key]["selected"] = []
             self.dict_filter[key]["menu"] = self.get_ctk_option_menu(
-                self.dict_filter[key]["option_list"]
+                self.dict_filter[key]["option_list"], key
             )
             self.create_button_reverse(
                 menu=self.dict_filter[key]["menu"],
@@ -211,18 +217,43 @@ class App(ctk.CTk):
         )
 
         ### Search Grid
+        self.search_var = ctk.StringVar()
         self.search_frame = ctk.CTkEntry(
-            self, width=900, height=50, border_width=2, corner_radius=10
+            self, width=900, height=50, border_width=2, corner_radius=10,
+            textvariable=self.search_var,
         )
         self.search_frame.grid(
             row=1, column=2, padx=(20, 20), pady=(5, 20), sticky="ew"
         )
         self.prev_search_frame = self.search_frame.get()
 
+        ### Refresh once typing pauses instead of on every keystroke
+        self.refresh_scheduler = RefreshScheduler(self, self.on_search_change)
+        self.search_var.trace_add("write", lambda *_: self.refresh_scheduler.request())
+
+        ### Number of items shown and warmed ahead of display
+        self.display_count = 4
+        self.prefetch_count = 12
+        self.prefetcher = ImagePrefetcher()
+        self.prefetch_poll_ms = 50
+
+        ### Headless filter and search engine, keeping keystroke state
+        ### unless rapidfuzz makes scoring from scratch cheaper
+        scorer = (
+            fuzzy_scorer
+            if fuzzy_scorer.backend == "rapidfuzz"
+            else TypeaheadScorer(text_index=text_index)
+        )
+        self.query_engine = QueryEngine(scorer=scorer)
+
     def get_display_items(self):
         """
         Get the items to display.
         """ 
+        ### This refresh covers any search refresh still waiting, and the text it searched
+        self.refresh_scheduler.cancel()
+        self.prev_search_frame = self.search_frame.get()
+
         ### Get all Current Filters
         set_default = {OPTION_MENU[key] for key in OPTION_MENU.keys()}
 
@@ -236,93 +267,100 @@ class App(ctk.CTk):
             return
 
         dict_curr_filters = {
-            key: self.dict_filter[key]["menu"].get()
+            key: tuple(self.dict_filter[key]["selected"])
             for key in self.dict_filter.keys()
-            if self.dict_filter[key]["menu"].get() not in set_default
+            if self.dict_filter[key]["selected"]
         }
 
+        ### Price stars only scale the price bounds, so on their own they filter nothing
+        if "price_min" not in dict_curr_filters and "price_max" not in dict_curr_filters:
+            dict_curr_filters.pop("price_stars", None)
+
         ### Check if searchable empty and filters are set
         if len(dict_curr_filters) == 0 and self.search_frame.get() == "":
             return
 
-        ### Query the list of items from filter and loop through list 
-        ### and pick only the ones that are not in the filter
-        for key in ITEM_DICT.keys():
-            add_to_list = True
-            for filt in dict_curr_filters.keys():
-                if filt == "gatherable_type":
-                    if (
-                        dict_curr_filters["gatherable_type"]
-                        != ITEM_DICT[key]["gatherable_type"]
-                    ):
-                        add_to_list = False
-                elif filt not in ITEM_DICT[key]["quality"].keys():
-                    add_to_list = False
-                elif dict_curr_filters[filt] != ITEM_DICT[key]["quality"][filt]:
-
-                    ### logic for seasons compares seasons that have extra suffixes (Spring vs Spring w2)
-                    ### SEASONS
-                    if (
-                        filt == "season"
-                        and len(dict_curr_filters[filt]) > 6
-                        and dict_curr_filters[filt][:6]
-                        == ITEM_DICT[key]["quality"][filt][:6]
-                    ):
-                        continue
-                    ### TOOLS
-                    if filt == "tool":
-                        tool_list = [i[0] for i in TOOL_QUALITY_LIST]
-                        if tool_list.index(
-                            ITEM_DICT[key]["quality"][filt]
-                        ) < tool_list.index(dict_curr_filters[filt]):
-                            continue
-                    ### TIME
-                    if filt == "time" and type(ITEM_DICT[key]["quality"][filt]) == set:
-                        if dict_curr_filters[filt] in ITEM_DICT[key]["quality"][filt]:
-                            continue
-
-                    ### Logic for Not Rain
-                    if (
-                        filt == "weather"
-                        and ITEM_DICT[key]["quality"][filt] == "Not Rain"
-                        and dict_curr_filters[filt] != "Rain"
-                    ):
-                        continue
-
-                    add_to_list = False
-
-            if add_to_list:
-                self.dict_display[key] = deepcopy(ITEM_DICT[key])
-
-        ### Check if there is a search query
-        if self.search_frame.get() != "":
-            search_val = self.search_frame.get()
-            self.dict_display = dict(
-                sorted(
-                    self.dict_display.items(),
-                    key=lambda x: fuzz.ratio(search_val.lower(), x[0].lower()),
-                    reverse=True,
-                )
-            )
-            self.dict_display = {
-                k: deepcopy(v)
-                for k, v in self.dict_display.items()
-                if fuzz.ratio(search_val.lower(), k.lower()) > 50
-            }
+        ### Filter and rank in the query engine
+        query = Query.make(dict_curr_filters, self.search_frame.get())
+        keys = self.query_engine.run(query)
+        self.dict_display = {key: ITEM_RECORDS[key] for key in keys}
+
+        ### Warm the images of the next results on the worker pool
+        self.prefetch_display_images()
 
         ### Changes display
         self.change_display()
 
-    def get_ctk_option_menu(self, values: list):
+    def get_item_images(self, key: str) -> list:
+        """
+        Get every image shown for an item with its display size.
+
+        Args:
+            key (str): Item key in ITEM_RECORDS
+
+        Returns:
+            list[tuple[str, tuple[int, int]]]: Path and size of the item, season, trait and poo images
+        """
+        record = ITEM_RECORDS[key]
+        images = [(f"images/items/{key}.webp", (30, 30))]
+        for season in record.spawn_seasons + record.seasons:
+            images.append((f"images/season/{season.base.lower()}.png", (20, 20)))
+        for trait_i in record.quality.get("trait", ()):
+            images.append((f"images/trait/{trait_i.capitalize()}.webp", (20, 20)))
+        if "poo" in record.quality:
+            images.append(("images/items/poo.webp", (20, 20)))
+        return images
+
+    def prefetch_display_images(self):
+        """
+        Prefetch the images of the results following the displayed ones,
+        at the scaling the registry renders them.
+        """
+        keys = list(self.dict_display)[self.display_count:self.prefetch_count]
+        self.prefetcher.prefetch(
+            [image for key in keys for image in self.get_item_images(key)],
+            self.image_registry.scale,
+        )
+
+    def get_ctk_option_menu(self, values: list, option: str):
         """
         Get the ctk option menu. 
+
+        Args:
+            values (list): The option list of the filter.
+            option (str): The filter the menu selects for.
         """
         return ctk.CTkOptionMenu(
             self.filter_frame,
             dynamic_resizing=False,
             values=[i[0] for i in values],
-            command=self.refresh_event,
+            command=lambda value: self.on_option_menu_select(option, value),
+        )
+
+    def on_option_menu_select(self, option: str, value: str):
+        """
+        Events that runs after a value is picked in an option menu.
+
+        Multi-value filters toggle the picked value in their selection,
+        the others replace it.
+
+        Args:
+            option (str): The filter the value was picked in.
+            value (str): The picked value.
+        """
+        selected = self.dict_filter[option]["selected"]
+        if option not in MULTI_FILTERS:
+            selected[:] = [value]
+        elif value in selected:
+            selected.remove(value)
+        else:
+            selected.append(value)
+
+        ### Show every selected value, the filter name when none
+        self.dict_filter[option]["menu"].set(
+            ", ".join(selected) if selected else OPTION_MENU[option]
         )
+        self.refresh_event(value)
 
     def create_button_reverse(self, menu: ctk.CTkOptionMenu, option: str, index: int, pady: tuple=(5, 0)):
         """
@@ -378,6 +416,7 @@ class App(ctk.CTk):
         """
         Events that runs after a reverse of the option menu.
         """
+        self.dict_filter[option]["selected"].clear()
         menu.set(OPTION_MENU[option])
         if refresh:
             self.refresh_event(None)
@@ -408,26 +447,27 @@ class App(ctk.CTk):
             self.list_display_labels = []
             self.dict_display = {}
 
-        brass = dwebp(f"images/items/brass.webp")
-        brass_image = ctk.CTkImage(brass, size=(30, 30))
-        brass_color = rgb_to_hex(average_rgb(brass))
+        ### Release images not shown in the recent renders
+        self.image_registry.begin_render(ctk.ScalingTracker.get_widget_scaling(self))
+
+        brass_image = self.image_registry.get("images/items/brass.webp", (30, 30))
+        brass_color = rgb_to_hex(color_index.rgb("images/items/brass.webp"))
 
-        star = dwebp(f"images/star.webp")
-        star_image = ctk.CTkImage(star, size=(20, 20))
+        star_image = self.image_registry.get("images/star.webp", (20, 20))
 
         ### Loops through the itemss
         for i, key in enumerate(self.dict_display.keys()):
-            if i >= 4:
+            if i >= self.display_count:
                 return
+            record = self.dict_display[key]
 
             ### Get image
-            image = dwebp(f"images/items/{key}.webp")
-            item_image = ctk.CTkImage(image, size=(30, 30))
+            item_image = self.image_registry.get(f"images/items/{key}.webp", (30, 30))
 
-            hex_avg_color = rgb_to_hex(average_rgb(image))
+            hex_avg_color = rgb_to_hex(color_index.rgb(f"images/items/{key}.webp"))
             name_label = ctk.CTkButton(
                 self.display_frame,
-                text=separate_pascal_case(key),
+                text=record.name,
                 fg_color=hex_avg_color,
                 compound="right",
                 image=item_image,
@@ -446,7 +486,7 @@ class App(ctk.CTk):
             ### Check for price
             brass_label = ctk.CTkButton(
                 self.display_frame,
-                text=ITEM_DICT[key]["price"],
+                text=record.price,
                 fg_color=brass_color,
                 compound="right",
                 image=brass_image,
@@ -460,7 +500,7 @@ class App(ctk.CTk):
 
             ### Check for location
             # Get number of locations
-            locations = ITEM_DICT[key]["location"]
+            locations = record.location
             INCREMENT = 0.15
             relx_start = 0.525 - INCREMENT * len(locations) / 2
             
@@ -485,9 +525,9 @@ class App(ctk.CTk):
             ### Check filters for spawn
             INCREMENT = 0.15
             QUALITY_HEIGHT_INCREMENT = 0.1
-            if "spawn" in ITEM_DICT[key]:
+            if record.spawn:
                 # Create item quality label
-                spawn = ITEM_DICT[key]["spawn"]
+                spawn = record.spawn
                 if "season" not in spawn:
                     relx_start = 0.525 - INCREMENT * len(spawn) / 2
                 else:
@@ -508,28 +548,20 @@ class App(ctk.CTk):
                 # To keep track of next label s
                 curr_label = 1
                 for _, spa in enumerate(spawn):
-                    val = ITEM_DICT[key]["spawn"][spa]
+                    val = spawn[spa]
                     if spa in OPTION_MENU.keys():
-                        if type(val) != set:
-                            val = set([val])
                         if spa == "season":
-                            for season_i in val:
+                            for season in record.spawn_seasons:
                                 ### Get Image for seasons
-                                season_file_name = season_i.lower()[:6]
-                                image_url = f"images/season/{season_file_name}.png"
-
-                                season_img = Image.open(image_url)
-                                ### Create the season icons
-                                season_icon = ctk.CTkImage(season_img, size=(20, 20))
-
-                                if image_url not in self.color_cache:
-                                    self.color_cache[image_url] = rgb_to_hex(
-                                        average_rgb(season_img)
-                                    )
-                                season_color = self.color_cache[image_url]
+                                image_url = f"images/season/{season.base.lower()}.png"
+
+                                ### Get the season icons
+                                season_icon = self.image_registry.get(image_url, (20, 20))
+
+                                season_color = rgb_to_hex(color_index.rgb(image_url))
                                 
                                 params = {
-                                        "text": f"Season:\n{season_i}",
+                                        "text": f"Season:\n{season.name}",
                                         "fg_color": season_color,
                                         "rely":placement_y + 0.10,
                                         "relx": relx_start + (INCREMENT * curr_label),
@@ -551,7 +583,7 @@ class App(ctk.CTk):
                         else:
                             for v in val:
                                 params = {
-                                        "text": f'{spa.capitalize()}:\n{val}',
+                                        "text": f'{spa.capitalize()}:\n{v}',
                                         "fg_color": "white",
                                         "rely":placement_y + 0.10,
                                         "relx": relx_start + (INCREMENT * curr_label),
@@ -560,29 +592,25 @@ class App(ctk.CTk):
                                 self._create_button(**params)
                                 curr_label += 1
                     elif spa == "area":
-                        params = {
-                                "text": f"Area:\n{val}",
-                                "fg_color": "white",
-                                "rely":placement_y + 0.10,
-                                "relx": relx_start + (INCREMENT * curr_label),
-                                "image": season_icon,
-                            }
-                        self._create_button(**params)
-                        curr_label += 1
+                        for v in val:
+                            params = {
+                                    "text": f"Area:\n{v}",
+                                    "fg_color": "white",
+                                    "rely":placement_y + 0.10,
+                                    "relx": relx_start + (INCREMENT * curr_label),
+                                    "image": season_icon,
+                                }
+                            self._create_button(**params)
+                            curr_label += 1
                 ### Update the initial positions for quality if spawn information exists
                 placement_y += 0.05
                 QUALITY_HEIGHT_INCREMENT = 0.11
                 
             ### Check filters for Item Quality
             # star_image
-            quality = ITEM_DICT[key]["quality"]
+            quality = record.quality
 
-            quantity = 0
-            for q in quality:
-                if type(q) == set:
-                    quantity += len(q)
-                else: 
-                    quantity += 1
+            quantity = len(quality)
 
             relx_start = 0.525 - INCREMENT * quantity / 2
 
@@ -600,27 +628,18 @@ class App(ctk.CTk):
             # To keep track of next label
             curr_label = 1
             for _, qual in enumerate(quality):
-                val = ITEM_DICT[key]["quality"][qual]
+                val = quality[qual]
                 if qual in OPTION_MENU.keys():
-                    if type(val) != set:
-                        val = set([val])
                     if qual == "season":
-                        ### Set as set if not set
-                        for v in val:
-                            season_file_name = v.lower()[:6]
-                            image_url = f"images/season/{season_file_name}.png"
-
-                            season_img = Image.open(image_url)
-                            ### Create the season icons
-                            season_icon = ctk.CTkImage(season_img, size=(20, 20))
-
-                            if image_url not in self.color_cache:
-                                self.color_cache[image_url] = rgb_to_hex(
-                                    average_rgb(season_img)
-                                )
-                            season_color = self.color_cache[image_url]
+                        for season in record.seasons:
+                            image_url = f"images/season/{season.base.lower()}.png"
+
+                            ### Get the season icons
+                            season_icon = self.image_registry.get(image_url, (20, 20))
+
+                            season_color = rgb_to_hex(color_index.rgb(image_url))
                             params = {
-                                "text": f"Season:\n{v}",
+                                "text": f"Season:\n{season.name}",
                                 "fg_color": season_color,
                                 "text_color": "white",
                                 "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
@@ -642,10 +661,8 @@ class App(ctk.CTk):
                     elif qual == "trait":
                         for trait_i in val:
                             image_url = f"images/trait/{trait_i.capitalize()}.webp"
-                            image = dwebp(image_url)
-
-                            trait_image = ctk.CTkImage(image, size=(20, 20))
-                            trait_color = rgb_to_hex(average_rgb(image))
+                            trait_image = self.image_registry.get(image_url, (20, 20))
+                            trait_color = rgb_to_hex(color_index.rgb(image_url))
                             
                             params = {
                                 "text": f"Trait:\n{trait_i}",
@@ -666,7 +683,7 @@ class App(ctk.CTk):
                                 "Shooting": "Slingshot",
                                 "Gathering": "Sickle",
                             }
-                            tool = tool_dict[ITEM_DICT[key]['gatherable_type']]
+                            tool = tool_dict[record.gatherable_type]
                             params = {
                                 "text": f'{tool}:\n{v}',
                                 "fg_color": "Grey",
@@ -686,8 +703,6 @@ class App(ctk.CTk):
                             self._create_button(**params)
                             curr_label += 1
                 elif qual == "misc":
-                    if type(val) != set:
-                        val = set([val])
                     for v in val:
                         params = {
                             "text": f"Misc:\n{v}",
@@ -698,41 +713,43 @@ class App(ctk.CTk):
                         self._create_button(**params)
                         curr_label += 1
                 elif qual == "ride":
-                    params = {
-                        "text": f"Ride:\n{val}",
-                        "fg_color": "pink",
-                        "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
-                        "relx": relx_start + (INCREMENT * curr_label),
-                    }
-                    self._create_button(**params)
-                    curr_label += 1
+                    for v in val:
+                        params = {
+                            "text": f"Ride:\n{v}",
+                            "fg_color": "pink",
+                            "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
+                            "relx": relx_start + (INCREMENT * curr_label),
+                        }
+                        self._create_button(**params)
+                        curr_label += 1
                 elif qual == "has":
-                    params = {
-                        "text": f"Has:\n{val}",
-                        "fg_color": "red",
-                        "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
-                        "relx": relx_start + (INCREMENT * curr_label),
-                    }
+                    for v in val:
+                        params = {
+                            "text": f"Has:\n{v}",
+                            "fg_color": "red",
+                            "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
+                            "relx": relx_start + (INCREMENT * curr_label),
+                        }
 
-                    self._create_button(**params)
-                    curr_label += 1
+                        self._create_button(**params)
+                        curr_label += 1
                 elif qual == "poo":
                     ### Get poo images
                     image_url = f"images/items/poo.webp"
-                    poo_bucket_img = dwebp(image_url)
-                    poo_image = ctk.CTkImage(poo_bucket_img, size=(20, 20))
-                    
-                    params = {
-                        "text": f"Fertilizer:\n{val} Poo",
-                        "fg_color": "brown",
-                        "text_color": "white",
-                        "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
-                        "relx": relx_start + (INCREMENT * curr_label),
-                        "image": poo_image,
-                    }
+                    poo_image = self.image_registry.get(image_url, (20, 20))
 
-                    self._create_button(**params)
-                    curr_label += 1
+                    for v in val:
+                        params = {
+                            "text": f"Fertilizer:\n{v} Poo",
+                            "fg_color": "brown",
+                            "text_color": "white",
+                            "rely": placement_y + QUALITY_HEIGHT_INCREMENT,
+                            "relx": relx_start + (INCREMENT * curr_label),
+                            "image": poo_image,
+                        }
+
+                        self._create_button(**params)
+                        curr_label += 1
                     
     def _create_button(self, 
                        text: str,
@@ -784,20 +801,30 @@ class App(ctk.CTk):
         self.list_display_labels.append(label)
     
     
+    def on_search_change(self):
+        """
+        Refresh the display if the search text changed since the last refresh.
+        """
+        var = self.search_frame.get()
+        if var == "":
+            self.prev_search_frame = var
+        elif self.prev_search_frame != var:
+            self.prev_search_frame = var
+            self.get_display_items()
+
+    def poll_prefetcher(self):
+        """
+        Hand finished prefetches back to the UI thread, then poll again later.
+        """
+        self.prefetcher.poll()
+        self.after(self.prefetch_poll_ms, self.poll_prefetcher)
+
     def start(self):
         """
         Starts the mainloop of the application
         """
-        while True:
-            var = self.search_frame.get()
-            if var == "":
-                self.prev_search_frame = self.search_frame.get()
-            elif self.prev_search_frame != var:
-                self.prev_search_frame = self.search_frame.get()
-                self.get_display_items()
-
-            self.update_idletasks()
-            self.update()
+        self.poll_prefetcher()
+        self.mainloop()
 
 if __name__ == "__main__":
     app = App()
@@ -101,6 +101,14 @@ TIME_LIST = [
     ("Exact Hour", None),
 ]
 
+PRICE_STAR_LIST = [
+    ("0 Stars", None),
+    ("1 Star", None),
+    ("2 Stars", None),
+    ("3 Stars", None),
+    ("4 Stars", None),
+]
+
 POO_LIST = ["Sheep", "Pig"]
 
 OPTION_MENU = {
@@ -111,4 +119,8 @@ OPTION_MENU = {
     "trait": "Trait",
     "season": "Season",
     "time": "Time",
+    "tool_min": "Min Tool Proficiency",
+    "price_stars": "Price Stars",
+    "price_min": "Min Price",
+    "price_max": "Max Price",
 }
\ No newline at end of file
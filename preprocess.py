@@ -0,0 +1,161 @@
+from assets import (
+    ATLAS_PATH,
+    IMAGE_DIR,
+    RAW_DIR,
+    THUMBNAIL_DIR,
+    ColorIndex,
+    average_rgb,
+    file_digest,
+    image_paths,
+    load_image,
+)
+from atlas import SPRITE_DIRS, build_atlas
+from thumbnails import SCALES, UI_SIZES, is_stale, render_thumbnail, scaled_size, write_thumbnail
+from rawcache import raw_path
+from rawcache import is_stale as raw_is_stale
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import time
+import os
+
+
+def process_image(path: str, pixel_sizes: list, need_color: bool) -> tuple:
+    """
+    Decode an image, writing its raw RGBA copy if missing, write its
+    stale thumbnails and average its color.
+
+    Runs in a worker process.
+
+    Args:
+        path (str): Path to image file
+        pixel_sizes (list[tuple[int, int]]): Thumbnail sizes to render
+        need_color (bool): Whether to compute the average color
+
+    Returns:
+        tuple: Path, average RGB, sha1 digest and per-stage seconds
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    image = load_image(path)
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for size in pixel_sizes:
+        write_thumbnail(THUMBNAIL_DIR, path, render_thumbnail(image, size))
+    timings["thumbnail"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rgb, digest = None, None
+    if need_color:
+        digest = file_digest(path)
+        rgb = average_rgb(image)
+    timings["average"] = time.perf_counter() - start
+
+    return path, rgb, digest, timings
+
+
+def atlas_is_stale(sprite_paths: list) -> bool:
+    """
+    Check whether the atlas is missing or differs from the sprite files.
+
+    Args:
+        sprite_paths (list[str]): Paths of the sprites to pack
+
+    Returns:
+        bool: True if the atlas must be built again
+    """
+    try:
+        with open(f"{ATLAS_PATH}.json") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if set(index) != set(sprite_paths):
+        return True
+    for path in sprite_paths:
+        stat = os.stat(path)
+        if (index[path]["mtime_ns"], index[path]["size"]) != (stat.st_mtime_ns, stat.st_size):
+            return True
+    return False
+
+
+def preprocess(image_dir: str = IMAGE_DIR, jobs: int = None, force: bool = False) -> dict:
+    """
+    Bring every generated cache file up to date, touching only changed files.
+
+    Args:
+        image_dir (str, optional): Root of the image assets. Defaults to images.
+        jobs (int, optional): Number of worker processes. Defaults to the number of cores.
+        force (bool, optional): Process every file even if up to date. Defaults to False.
+
+    Returns:
+        dict: Wall seconds per stage and summed worker seconds per sub-stage
+    """
+    timings = {}
+    worker_timings = {"decode": 0.0, "thumbnail": 0.0, "average": 0.0}
+
+    ### Find the files whose raw copies, colors or thumbnails are out of date
+    start = time.perf_counter()
+    color_index = ColorIndex().load()
+    paths = image_paths(image_dir)
+    pixel_sizes = [scaled_size(size, scale) for size in UI_SIZES for scale in SCALES]
+    work = []
+    for path in paths:
+        need_color = force or not color_index.is_fresh(path)
+        stale_sizes = [
+            size for size in pixel_sizes if force or is_stale(THUMBNAIL_DIR, path, size)
+        ]
+        need_raw = raw_is_stale(raw_path(RAW_DIR, path), path)
+        if need_color or stale_sizes or need_raw:
+            work.append((path, stale_sizes, need_color))
+    timings["scan"] = time.perf_counter() - start
+
+    ### Decode, thumbnail and average the changed files across cores
+    start = time.perf_counter()
+    if work:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(process_image, *zip(*work)))
+    else:
+        results = []
+    for path, rgb, digest, worker in results:
+        if digest is not None:
+            color_index.update(path, rgb, digest)
+        for stage, seconds in worker.items():
+            worker_timings[stage] += seconds
+    timings["process"] = time.perf_counter() - start
+
+    ### Write the color index
+    start = time.perf_counter()
+    color_index.prune(image_dir, set(paths))
+    color_index.save()
+    timings["colors"] = time.perf_counter() - start
+
+    ### Pack the sprites if any of them changed
+    start = time.perf_counter()
+    sprite_paths = [
+        path
+        for path in paths
+        if os.path.relpath(os.path.dirname(path), image_dir) in SPRITE_DIRS
+    ]
+    if force or atlas_is_stale(sprite_paths):
+        build_atlas(image_dir, ATLAS_PATH)
+    timings["atlas"] = time.perf_counter() - start
+
+    return {"files": len(paths), "changed": len(work), "stages": timings, "workers": worker_timings}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the image caches")
+    parser.add_argument("--images", default=IMAGE_DIR, help="image asset root")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--force", action="store_true", help="process every file")
+    args = parser.parse_args()
+
+    report = preprocess(args.images, args.jobs, args.force)
+    print(f"{report['changed']} of {report['files']} images changed")
+    for stage, seconds in report["stages"].items():
+        print(f"  {stage:<10} {seconds * 1000:8.1f} ms")
+    print("Worker time")
+    for stage, seconds in report["workers"].items():
+        print(f"  {stage:<10} {seconds * 1000:8.1f} ms")
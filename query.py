@@ -0,0 +1,266 @@
+from catalog import RANGE_FILTERS, item_index, normalize_filters, selection_values
+from search import fuzzy_scorer
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class Query(NamedTuple):
+    """
+    Normalized query: sorted filter selections and lowercased search text.
+
+    A filter holding several values is stored as a sorted tuple of them.
+    """
+
+    filters: tuple = ()
+    search: str = ""
+
+    @classmethod
+    def make(cls, filters: dict = None, search: str = "") -> "Query":
+        """
+        Build a normalized query.
+
+        Args:
+            filters (dict[str, str | iterable[str]], optional): Selected value or values of each active filter. Defaults to None.
+            search (str, optional): Search text. Defaults to "".
+
+        Returns:
+            Query: Normalized query
+        """
+        return cls(normalize_filters(filters or {}), search.lower())
+
+
+class ResultCache:
+    """
+    LRU cache of ranked query results keyed by normalized Query.
+
+    Results are tied to the catalog they were computed from and the whole
+    cache is dropped as soon as a different catalog is queried.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Initialize the ResultCache.
+
+        Args:
+            max_entries (int, optional): Number of results kept. Defaults to 256.
+        """
+        self.max_entries = max_entries
+        self.catalog = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, catalog, query: Query) -> tuple:
+        """
+        Get the cached result of a query.
+
+        Args:
+            catalog (object): Catalog the query runs against
+            query (Query): Normalized query
+
+        Returns:
+            tuple[str] | None: Ranked item keys, None on a miss
+        """
+        if catalog is not self.catalog:
+            self.clear()
+            self.catalog = catalog
+        if query in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(query)
+            return self._entries[query]
+        self.misses += 1
+        return None
+
+    def put(self, query: Query, keys: tuple) -> None:
+        """
+        Store the result of a query.
+
+        Args:
+            query (Query): Normalized query
+            keys (tuple[str]): Ranked item keys
+        """
+        self._entries[query] = keys
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove every result and reset the counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Hits, misses, hit rate and entries
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+class IncrementalQuery:
+    """
+    Evaluate queries against the previous result when the filters narrow.
+
+    When the new filters keep every previous filter and only add new ones
+    or drop values from a multi-value selection, the result can only
+    shrink: only the changed filters are intersected with the previous
+    candidates, and with unchanged search text the previous ranking is
+    filtered instead of scored again. Any other change falls back to a
+    full evaluation.
+    """
+
+    def __init__(self, index, scorer=fuzzy_scorer):
+        """
+        Initialize the IncrementalQuery.
+
+        Args:
+            index (ItemIndex): Index the queries run against
+            scorer (FuzzyScorer, optional): Ranks keys by search text. Defaults to fuzzy_scorer.
+        """
+        self.index = index
+        self.scorer = scorer
+        self.filters = None
+        self.search = None
+        self.mask = 0
+        self.keys = ()
+        self.full = 0
+        self.refined = 0
+
+    def narrows(self, filters: dict) -> bool:
+        """
+        Check whether filters keep or narrow every previous selection.
+
+        Args:
+            filters (dict[str, str | tuple[str]]): Normalized selection of each active filter
+
+        Returns:
+            bool: True if the result is a subset of the previous one
+        """
+        if self.filters is None:
+            return False
+        for dimension, selected in self.filters.items():
+            if dimension not in filters:
+                return False
+            if selected == filters[dimension]:
+                continue
+            ### Ranges move rather than narrow, values of a selection only narrow
+            if dimension in RANGE_FILTERS or not (
+                selection_values(filters[dimension]) <= selection_values(selected)
+            ):
+                return False
+        ### Picking a star level moves the price bounds already set
+        return not (
+            "price_stars" in filters
+            and "price_stars" not in self.filters
+            and ("price_min" in self.filters or "price_max" in self.filters)
+        )
+
+    def run(self, filters: dict, search: str) -> tuple:
+        """
+        Get the ranked item keys of a query.
+
+        Args:
+            filters (dict[str, str | tuple[str]]): Normalized selection of each active filter
+            search (str): Search text
+
+        Returns:
+            tuple[str]: Ranked item keys
+        """
+        if self.narrows(filters):
+            self.refined += 1
+            added = {d: v for d, v in filters.items() if self.filters.get(d) != v}
+            ### Ranges are compiled together, so pass all of them along
+            if any(d in RANGE_FILTERS for d in added):
+                added.update({d: v for d, v in filters.items() if d in RANGE_FILTERS})
+            mask = self.mask & self.index.compile(added).mask
+            if search.lower() == self.search.lower():
+                kept = set(self.index.keys_of(mask))
+                keys = tuple(k for k in self.keys if k in kept)
+            else:
+                keys = self.scorer.rank(self.index.keys_of(mask), search)
+        else:
+            self.full += 1
+            plan = self.index.compile(filters)
+            mask = plan.mask
+            keys = self.scorer.rank(plan.keys, search)
+
+        self.filters = dict(filters)
+        self.search = search
+        self.mask = mask
+        self.keys = keys
+        return keys
+
+
+class QueryEngine:
+    """
+    Headless filter and search engine over an ItemIndex.
+
+    Takes Query objects and returns ranked item keys, with no dependency
+    on Tk, so it can be benchmarked and load-tested on its own.
+    """
+
+    def __init__(self, index=item_index, cache_size: int = 256, scorer=fuzzy_scorer):
+        """
+        Initialize the QueryEngine.
+
+        Args:
+            index (ItemIndex, optional): Index to query. Defaults to item_index.
+            cache_size (int, optional): Number of results kept. Defaults to 256.
+            scorer (FuzzyScorer, optional): Ranks keys by search text. Defaults to fuzzy_scorer.
+        """
+        self.index = index
+        self.scorer = scorer
+        self.result_cache = ResultCache(cache_size)
+        self.incremental_query = IncrementalQuery(index, scorer)
+
+    def run(self, query: Query) -> tuple:
+        """
+        Get the ranked item keys of a query.
+
+        Args:
+            query (Query): Normalized query
+
+        Returns:
+            tuple[str]: Ranked item keys
+        """
+        keys = self.result_cache.get(self.index, query)
+        if keys is None:
+            ### Filter and rank, reusing the previous result when filters narrow
+            keys = self.incremental_query.run(dict(query.filters), query.search)
+            self.result_cache.put(query, keys)
+        return keys
+
+    def run_batch(self, queries: list) -> list:
+        """
+        Get the ranked item keys of many queries in one call.
+
+        Queries sharing filters share one filter evaluation. The batch
+        does not disturb the incremental state used by run().
+
+        Args:
+            queries (list[Query]): Normalized queries
+
+        Returns:
+            list[tuple[str]]: Ranked item keys of each query
+        """
+        plans = {}
+        results = []
+        for query in queries:
+            keys = self.result_cache.get(self.index, query)
+            if keys is None:
+                if query.filters not in plans:
+                    plans[query.filters] = self.index.compile(dict(query.filters))
+                keys = self.scorer.rank(plans[query.filters].keys, query.search)
+                self.result_cache.put(query, keys)
+            results.append(keys)
+        return results
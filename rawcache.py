@@ -0,0 +1,125 @@
+from PIL import Image
+import threading
+import struct
+import mmap
+import os
+
+### Raw RGBA header: magic, width, height, source mtime and source size
+HEADER = struct.Struct("<4sHHqq")
+MAGIC = b"KRGB"
+
+
+def raw_path(raw_dir: str, path: str, size: tuple = None) -> str:
+    """
+    Get the path of the raw RGBA copy of an image.
+
+    Args:
+        raw_dir (str): Directory holding the raw files
+        path (str): Path to the source image
+        size (tuple[int, int], optional): Pixel size of a thumbnail. Defaults to None.
+
+    Returns:
+        str: Path of the raw RGBA file
+    """
+    suffix = "" if size is None else f"@{size[0]}x{size[1]}"
+    return os.path.join(raw_dir, f"{os.path.normpath(path)}{suffix}.rgba")
+
+
+def write_raw(out: str, path: str, image: Image) -> str:
+    """
+    Store an image as raw RGBA tagged with its source's stat.
+
+    Args:
+        out (str): Path of the raw RGBA file
+        path (str): Path to the source image
+        image (Image): PIL Image
+
+    Returns:
+        str: Path of the raw RGBA file
+    """
+    stat = os.stat(path)
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    tmp = f"{out}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, *image.size, stat.st_mtime_ns, stat.st_size))
+        f.write(image.tobytes())
+    os.replace(tmp, out)
+    return out
+
+
+def _is_valid(header: bytes, length: int, path: str, size: tuple) -> bool:
+    """
+    Check a raw file header against its source and expected size.
+
+    Args:
+        header (bytes): Header bytes
+        length (int): Total length of the raw file
+        path (str): Path to the source image
+        size (tuple[int, int] | None): Expected pixel size, None for any
+
+    Returns:
+        bool: True if the pixels can be used as they are
+    """
+    if len(header) != HEADER.size:
+        return False
+    magic, width, height, mtime_ns, source_size = HEADER.unpack(header)
+    stat = os.stat(path)
+    return (
+        magic == MAGIC
+        and (size is None or (width, height) == tuple(size))
+        and mtime_ns == stat.st_mtime_ns
+        and source_size == stat.st_size
+        and length == HEADER.size + width * height * 4
+    )
+
+
+def is_stale(out: str, path: str, size: tuple = None) -> bool:
+    """
+    Check whether a raw file is missing or older than its source.
+
+    Args:
+        out (str): Path of the raw RGBA file
+        path (str): Path to the source image
+        size (tuple[int, int], optional): Expected pixel size. Defaults to None.
+
+    Returns:
+        bool: True if the raw file must be written again
+    """
+    try:
+        with open(out, "rb") as f:
+            header = f.read(HEADER.size)
+            length = os.fstat(f.fileno()).st_size
+    except OSError:
+        return True
+    return not _is_valid(header, length, path, size)
+
+
+def map_raw(out: str, path: str, size: tuple = None) -> Image:
+    """
+    Memory-map a raw RGBA file as an image, without decoding or copying.
+
+    The returned image is read-only and backed by the mapping, so the
+    pages are shared with every process mapping the same file.
+
+    Args:
+        out (str): Path of the raw RGBA file
+        path (str): Path to the source image
+        size (tuple[int, int], optional): Expected pixel size. Defaults to None.
+
+    Returns:
+        Image | None: RGBA PIL Image, None if missing or stale
+    """
+    try:
+        with open(out, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if not _is_valid(buffer[:HEADER.size], len(buffer), path, size):
+        buffer.close()
+        return None
+    _, width, height, _, _ = HEADER.unpack_from(buffer)
+    return Image.frombuffer(
+        "RGBA", (width, height), memoryview(buffer)[HEADER.size:], "raw", "RGBA", 0, 1
+    )
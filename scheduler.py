@@ -0,0 +1,80 @@
+import time
+
+### Pause in input before a refresh runs, and the longest a refresh waits
+QUIET_MS = 150
+MAX_LATENCY_MS = 400
+
+
+class RefreshScheduler:
+    """
+    Coalesce bursts of refresh requests into one call on a Tk widget's
+    event loop.
+
+    Every request cancels the pending call and schedules it again after
+    the quiet period, so a burst of input runs the callback once when it
+    stops. The delay is cut short so that no request waits longer than
+    the maximum latency, even while input keeps coming.
+    """
+
+    def __init__(self, widget, callback, quiet_ms: int = QUIET_MS, max_latency_ms: int = MAX_LATENCY_MS, clock=time.perf_counter):
+        """
+        Initialize the RefreshScheduler.
+
+        Args:
+            widget (tk.Misc): Widget whose after() runs the callback
+            callback (callable): Refresh to run
+            quiet_ms (int, optional): Pause in input before refreshing. Defaults to QUIET_MS.
+            max_latency_ms (int, optional): Longest wait of a request. Defaults to MAX_LATENCY_MS.
+            clock (callable, optional): Seconds clock. Defaults to time.perf_counter.
+        """
+        self.widget = widget
+        self.callback = callback
+        self.quiet_ms = quiet_ms
+        self.max_latency_ms = max_latency_ms
+        self.clock = clock
+        self.pending = None
+        self.first_request = None
+        self.requests = 0
+        self.refreshes = 0
+
+    def request(self) -> None:
+        """
+        Ask for a refresh, replacing the pending one.
+        """
+        now = self.clock()
+        if self.first_request is None:
+            self.first_request = now
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+
+        ### Wait for the quiet period, but no longer than the oldest request allows
+        waited_ms = (now - self.first_request) * 1000
+        delay_ms = max(0, min(self.quiet_ms, self.max_latency_ms - waited_ms))
+        self.pending = self.widget.after(int(delay_ms), self._run)
+        self.requests += 1
+
+    def cancel(self) -> None:
+        """
+        Drop the pending refresh, if any.
+        """
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+        self.pending = None
+        self.first_request = None
+
+    def flush(self) -> None:
+        """
+        Run the pending refresh now, if any.
+        """
+        if self.pending is not None:
+            self.cancel()
+            self._run()
+
+    def _run(self) -> None:
+        """
+        Run the callback for every request made since the last refresh.
+        """
+        self.pending = None
+        self.first_request = None
+        self.refreshes += 1
+        self.callback()
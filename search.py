@@ -0,0 +1,702 @@
+from catalog import ITEM_RECORDS
+from fuzzywuzzy import fuzz
+from difflib import SequenceMatcher
+from typing import NamedTuple
+from bisect import bisect_left
+import math
+import re
+
+try:
+    from rapidfuzz import fuzz as rapidfuzz_fuzz
+    from rapidfuzz import process as rapidfuzz_process
+except ImportError:
+    rapidfuzz_process = None
+
+### Lowest fuzzy ratio for an item to match the search text
+SEARCH_THRESHOLD = 50
+
+### Fuzzy scoring backends in order of preference
+SEARCH_BACKENDS = ("rapidfuzz", "difflib", "fuzzywuzzy")
+
+### Weight of a token in each text field of an item
+FIELD_WEIGHTS = {"name": 3.0, "trait": 2.0, "location": 1.5, "area": 1.5, "condition": 1.0}
+
+### BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _percent(ratio: float) -> int:
+    """
+    Round a similarity ratio to an integer percentage, as fuzz.ratio does.
+
+    Args:
+        ratio (float): Similarity between 0 and 1
+
+    Returns:
+        int: Similarity between 0 and 100
+    """
+    return int(round(100 * ratio))
+
+
+def _scores_fuzzywuzzy(search: str, names: list, cutoff: int) -> list:
+    """
+    Score names with fuzz.ratio, the reference implementation.
+
+    Args:
+        search (str): Lowercased search text
+        names (list[str]): Lowercased names
+        cutoff (int): Scores at or below it are dropped
+
+    Returns:
+        list[tuple[int, int]]: Position and score of the names above the cutoff
+    """
+    scores = []
+    for position, name in enumerate(names):
+        score = fuzz.ratio(search, name)
+        if score > cutoff:
+            scores.append((position, score))
+    return scores
+
+
+def _scores_difflib(search: str, names: list, cutoff: int) -> list:
+    """
+    Score names with difflib, skipping the full match when an upper bound
+    of the ratio is already at or below the cutoff.
+
+    Gives the same scores as fuzz.ratio without python-Levenshtein.
+
+    Args:
+        search (str): Lowercased search text
+        names (list[str]): Lowercased names
+        cutoff (int): Scores at or below it are dropped
+
+    Returns:
+        list[tuple[int, int]]: Position and score of the names above the cutoff
+    """
+    scores = []
+    matcher = SequenceMatcher(None, search)
+    for position, name in enumerate(names):
+        if not name:
+            continue
+        matcher.set_seq2(name)
+        ### Length bound, then character count bound, then the real ratio
+        if _percent(matcher.real_quick_ratio()) <= cutoff:
+            continue
+        if _percent(matcher.quick_ratio()) <= cutoff:
+            continue
+        score = _percent(matcher.ratio())
+        if score > cutoff:
+            scores.append((position, score))
+    return scores
+
+
+def _scores_rapidfuzz(search: str, names: list, cutoff: int) -> list:
+    """
+    Score names with rapidfuzz in C, which stops early below the cutoff.
+
+    Args:
+        search (str): Lowercased search text
+        names (list[str]): Lowercased names
+        cutoff (int): Scores at or below it are dropped
+
+    Returns:
+        list[tuple[int, int]]: Position and score of the names above the cutoff
+    """
+    matches = rapidfuzz_process.extract(
+        search,
+        names,
+        scorer=rapidfuzz_fuzz.ratio,
+        processor=None,
+        score_cutoff=cutoff,
+        limit=None,
+    )
+    scores = []
+    for _, ratio, position in matches:
+        score = _percent(ratio / 100)
+        if score > cutoff:
+            scores.append((position, score))
+    return scores
+
+
+_SCORERS = {
+    "rapidfuzz": _scores_rapidfuzz,
+    "difflib": _scores_difflib,
+    "fuzzywuzzy": _scores_fuzzywuzzy,
+}
+
+
+def available_backends() -> list:
+    """
+    Get the fuzzy scoring backends usable in this process.
+
+    Returns:
+        list[str]: Backend names in order of preference
+    """
+    backends = []
+    if rapidfuzz_process is not None:
+        backends.append("rapidfuzz")
+    backends.extend(["difflib", "fuzzywuzzy"])
+    return backends
+
+
+def trigrams(text: str) -> dict:
+    """
+    Count the trigrams of a text.
+
+    Args:
+        text (str): Text
+
+    Returns:
+        dict[str, int]: Occurrences of each trigram
+    """
+    counts = {}
+    for i in range(len(text) - 2):
+        gram = text[i:i + 3]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def min_matches(length: int, threshold: int) -> int:
+    """
+    Get the fewest matched characters for a ratio above the threshold.
+
+    Args:
+        length (int): Length of the search text plus length of the name
+        threshold (int): Scores at or below it are dropped
+
+    Returns:
+        int: Lowest number of matched characters
+    """
+    matches = threshold * length // 200
+    while _percent(2 * matches / length) <= threshold:
+        matches += 1
+    return matches
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigrams to the names holding them, used to skip
+    names that cannot score above the threshold.
+
+    Both backends score 2 * M / T where M, the matched characters, is at
+    most the longest common subsequence and T is the summed length. A
+    name shorter than the M needed is skipped. Aligning M characters of
+    a search of length n breaks at most 3 trigrams per unmatched search
+    character and 2 per gap in the name, so at least 5 * M - 2 * T - 2
+    trigram occurrences are shared and names sharing fewer are skipped.
+    That bound only bites for high thresholds, at 50 only the length
+    bound prunes.
+    """
+
+    def __init__(self):
+        """
+        Initialize the TrigramIndex.
+        """
+        self.names = set()
+        self.postings = {}
+
+    def add(self, name: str) -> None:
+        """
+        Index a name.
+
+        Args:
+            name (str): Lowercased name
+        """
+        if name in self.names:
+            return
+        self.names.add(name)
+        for gram, count in trigrams(name).items():
+            self.postings.setdefault(gram, {})[name] = count
+
+    def shared(self, search: str) -> dict:
+        """
+        Count the trigram occurrences each indexed name shares with the search.
+
+        Args:
+            search (str): Lowercased search text
+
+        Returns:
+            dict[str, int]: Shared occurrences of every name sharing any
+        """
+        shared = {}
+        for gram, count in trigrams(search).items():
+            for name, name_count in self.postings.get(gram, {}).items():
+                shared[name] = shared.get(name, 0) + min(count, name_count)
+        return shared
+
+    def shortlist(self, search: str, names: list, threshold: int) -> list:
+        """
+        Get the names that may score above the threshold.
+
+        Args:
+            search (str): Lowercased search text
+            names (list[str]): Indexed lowercased names
+            threshold (int): Scores at or below it are dropped
+
+        Returns:
+            list[int]: Positions of the candidates in names, in order
+        """
+        ### Trigrams to share for each name length, None if too short or long
+        required = {}
+        for length in {len(name) for name in names}:
+            total = len(search) + length
+            matches = min_matches(total, threshold) if total else 1
+            if matches > min(len(search), length):
+                required[length] = None
+            else:
+                required[length] = 5 * matches - 2 * total - 2
+
+        shared = None
+        if any(r is not None and r > 0 for r in required.values()):
+            shared = self.shared(search)
+
+        positions = []
+        for position, name in enumerate(names):
+            need = required[len(name)]
+            if need is None:
+                continue
+            if need > 0 and shared.get(name, 0) < need:
+                continue
+            positions.append(position)
+        return positions
+
+
+class FuzzyScorer:
+    """
+    Rank item keys by fuzzy ratio against search text.
+
+    Every key is scored once per search against its lowercased form,
+    which is computed once and kept, after a TrigramIndex skips the keys
+    that cannot reach the threshold. Only keys above it are sorted.
+    rapidfuzz scores like fuzzywuzzy with python-Levenshtein, difflib
+    like fuzzywuzzy without it, and the two differ by a point on some
+    names.
+    """
+
+    def __init__(self, backend: str = None, threshold: int = SEARCH_THRESHOLD, text_index=None):
+        """
+        Initialize the FuzzyScorer.
+
+        Args:
+            backend (str, optional): Scoring backend. Defaults to the first available.
+            threshold (int, optional): Scores at or below it are dropped. Defaults to SEARCH_THRESHOLD.
+            text_index (TextIndex, optional): Index whose hits follow the name matches. Defaults to None.
+        """
+        self.backend = backend or available_backends()[0]
+        self.threshold = threshold
+        self.text_index = text_index
+        self.names = {}
+        self.trigram_index = TrigramIndex()
+
+    def name(self, key: str) -> str:
+        """
+        Get the lowercased form of an item key.
+
+        Args:
+            key (str): Item key
+
+        Returns:
+            str: Lowercased key
+        """
+        name = self.names.get(key)
+        if name is None:
+            name = self.names[key] = key.lower()
+            self.trigram_index.add(name)
+        return name
+
+    def rank(self, keys: list, search: str) -> tuple:
+        """
+        Rank item keys by fuzzy ratio against the search text, followed by
+        the other hits of the text index.
+
+        Args:
+            keys (list[str]): Item keys in catalog order
+            search (str): Search text, empty to keep every key as is
+
+        Returns:
+            tuple[str]: Matching keys, best match first, ties in catalog order
+        """
+        if search == "":
+            return tuple(keys)
+        ranked = self.rank_names(keys, search.lower())
+        if self.text_index is None:
+            return ranked
+        return ranked + self.text_index.rank(keys, search, exclude=set(ranked))
+
+    def rank_names(self, keys: list, search: str) -> tuple:
+        """
+        Rank item keys by fuzzy ratio against the search text.
+
+        Args:
+            keys (list[str]): Item keys in catalog order
+            search (str): Lowercased search text
+
+        Returns:
+            tuple[str]: Keys above the threshold, best match first, ties in catalog order
+        """
+        names = [self.name(key) for key in keys]
+        positions = self.trigram_index.shortlist(search, names, self.threshold)
+        scores = _SCORERS[self.backend](
+            search, [names[position] for position in positions], self.threshold
+        )
+        scores.sort(key=lambda score: (-score[1], score[0]))
+        return tuple(keys[positions[i]] for i, _ in scores)
+
+
+class TypeaheadFrame(NamedTuple):
+    """
+    State of a TypeaheadScorer after one character of the search text.
+    """
+
+    text: str
+    node: dict
+    vectors: list
+
+
+class TypeaheadScorer(FuzzyScorer):
+    """
+    FuzzyScorer keeping per-keystroke state for a search being typed.
+
+    One frame is kept per character of the current text. Each frame holds
+    the prefix trie node of the text, if any name starts with it, and a
+    bit-parallel LCS vector of the text against every known name.
+    Appending a character pushes a frame computed from the previous one
+    with a few integer operations per name, backspace pops frames, and
+    any other edit pops back to the common prefix, so an unrelated edit
+    starts over from the empty text.
+
+    The LCS bounds the matched characters of every backend, so names at
+    or below the threshold are never scored. Names the text is a prefix
+    of match on the whole text, and with rapidfuzz the LCS ratio is the
+    score, so neither calls the backend.
+    """
+
+    def __init__(self, backend: str = None, threshold: int = SEARCH_THRESHOLD, text_index=None):
+        """
+        Initialize the TypeaheadScorer.
+
+        Args:
+            backend (str, optional): Scoring backend. Defaults to the first available.
+            threshold (int, optional): Scores at or below it are dropped. Defaults to SEARCH_THRESHOLD.
+            text_index (TextIndex, optional): Index whose hits follow the name matches. Defaults to None.
+        """
+        super().__init__(backend, threshold, text_index)
+        self.ids = {}
+        self.masks = []
+        self.full = []
+        self.trie = {"ids": set(), "next": {}}
+        self.frames = [TypeaheadFrame("", self.trie, [])]
+        self.pushed = 0
+        self.popped = 0
+
+    def name(self, key: str) -> str:
+        """
+        Get the lowercased form of an item key, adding it to the state.
+
+        Args:
+            key (str): Item key
+
+        Returns:
+            str: Lowercased key
+        """
+        name = self.names.get(key)
+        if name is None:
+            name = self.names[key] = key.lower()
+            if name not in self.ids:
+                self._add(name)
+        return name
+
+    def _add(self, name: str) -> None:
+        """
+        Add a name to the trie and replay the current text against it.
+
+        Args:
+            name (str): Lowercased name
+        """
+        name_id = len(self.masks)
+        self.ids[name] = name_id
+
+        ### Positions of each character in the name
+        masks = {}
+        for i, char in enumerate(name):
+            masks[char] = masks.get(char, 0) | 1 << i
+        self.masks.append(masks)
+        self.full.append((1 << len(name)) - 1)
+
+        node = self.trie
+        node["ids"].add(name_id)
+        for char in name:
+            node = node["next"].setdefault(char, {"ids": set(), "next": {}})
+            node["ids"].add(name_id)
+
+        vector = self.full[name_id]
+        for depth, frame in enumerate(self.frames):
+            if depth:
+                vector = self._step(vector, masks, frame.text[-1])
+            frame.vectors.append(vector)
+        ### The name may have created the trie nodes of the text
+        self.frames = [frame._replace(node=self._node(frame.text)) for frame in self.frames]
+
+    def _node(self, text: str) -> dict:
+        """
+        Get the trie node of a text.
+
+        Args:
+            text (str): Lowercased text
+
+        Returns:
+            dict | None: Node holding the ids of the names starting with the text
+        """
+        node = self.trie
+        for char in text:
+            node = node["next"].get(char)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _step(vector: int, masks: dict, char: str) -> int:
+        """
+        Advance a bit-parallel LCS vector by one character of the text.
+
+        Args:
+            vector (int): Vector of the text so far, zero bits count the LCS
+            masks (dict[str, int]): Positions of each character in the name
+            char (str): Appended character
+
+        Returns:
+            int: Vector of the text with the character appended
+        """
+        matched = vector & masks.get(char, 0)
+        return (vector + matched) | (vector - matched)
+
+    def seek(self, text: str) -> TypeaheadFrame:
+        """
+        Move the state to a text, keeping the frames of the common prefix.
+
+        Args:
+            text (str): Lowercased search text
+
+        Returns:
+            TypeaheadFrame: Frame of the text
+        """
+        current = self.frames[-1].text
+        common = 0
+        while common < min(len(current), len(text)) and current[common] == text[common]:
+            common += 1
+        self.popped += len(self.frames) - 1 - common
+        del self.frames[common + 1:]
+
+        for char in text[common:]:
+            previous = self.frames[-1]
+            node = None if previous.node is None else previous.node["next"].get(char)
+            vectors = [
+                self._step(vector, masks, char)
+                for vector, masks in zip(previous.vectors, self.masks)
+            ]
+            self.frames.append(TypeaheadFrame(previous.text + char, node, vectors))
+            self.pushed += 1
+        return self.frames[-1]
+
+    def rank_names(self, keys: list, search: str) -> tuple:
+        """
+        Rank item keys by fuzzy ratio against the search text.
+
+        Args:
+            keys (list[str]): Item keys in catalog order
+            search (str): Lowercased search text
+
+        Returns:
+            tuple[str]: Keys above the threshold, best match first, ties in catalog order
+        """
+        names = [self.name(key) for key in keys]
+        frame = self.seek(search)
+        prefixed = () if frame.node is None else frame.node["ids"]
+
+        scores = []
+        pending = []
+        for position, name in enumerate(names):
+            name_id = self.ids[name]
+            total = len(search) + len(name)
+            lcs = len(name) - bin(frame.vectors[name_id] & self.full[name_id]).count("1")
+            bound = _percent(2 * lcs / total)
+            if bound <= self.threshold:
+                continue
+            ### difflib's autojunk heuristic only applies to names of 200 characters or more
+            if self.backend == "rapidfuzz" or (name_id in prefixed and len(name) < 200):
+                scores.append((position, bound))
+            else:
+                pending.append(position)
+
+        for i, score in _SCORERS[self.backend](
+            search, [names[position] for position in pending], self.threshold
+        ):
+            scores.append((pending[i], score))
+        scores.sort(key=lambda score: (-score[1], score[0]))
+        return tuple(keys[position] for position, _ in scores)
+
+
+def tokenize(text: str) -> list:
+    """
+    Split a text into lowercased alphanumeric tokens.
+    Example:
+        tokenize("Tir Na Nog") -> ["tir", "na", "nog"]
+
+    Args:
+        text (str): Text
+
+    Returns:
+        list[str]: Tokens in order
+    """
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def record_fields(record) -> dict:
+    """
+    Get the searchable texts of an item by field.
+
+    Args:
+        record (ItemRecord): Item record
+
+    Returns:
+        dict[str, list[str]]: Texts of each field of FIELD_WEIGHTS
+    """
+    conditions = [
+        value
+        for field, values in list(record.quality.items()) + list(record.spawn.items())
+        if field not in ("trait", "area")
+        for value in sorted(values)
+    ]
+    return {
+        "name": [record.name],
+        "trait": sorted(record.quality.get("trait", ())),
+        "location": list(record.location),
+        "area": sorted(record.spawn.get("area", ())),
+        "condition": conditions,
+    }
+
+
+class TextIndex:
+    """
+    Token index over the names, locations, spawn areas, traits and
+    conditions of every item, ranked with BM25 over field-weighted term
+    frequencies.
+
+    The weight of every term in every item is computed at build time, so
+    a search only looks up postings: each search token matches the terms
+    it is a prefix of, found by bisecting the sorted vocabulary, and an
+    item must match every token.
+    """
+
+    def __init__(self, records: dict = ITEM_RECORDS, field_weights: dict = FIELD_WEIGHTS):
+        """
+        Initialize the TextIndex.
+
+        Args:
+            records (dict, optional): Item records to index. Defaults to ITEM_RECORDS.
+            field_weights (dict, optional): Weight of a token in each field. Defaults to FIELD_WEIGHTS.
+        """
+        ### Field-weighted frequency of each term and length of each item
+        frequencies = {}
+        lengths = {}
+        for key, record in records.items():
+            length = 0.0
+            for field, texts in record_fields(record).items():
+                weight = field_weights[field]
+                for text in texts:
+                    for token in tokenize(text):
+                        counts = frequencies.setdefault(token, {})
+                        counts[key] = counts.get(key, 0.0) + weight
+                        length += weight
+            lengths[key] = length
+        average = sum(lengths.values()) / len(lengths) if lengths else 0.0
+
+        self.document_count = len(lengths)
+        self.document_frequency = {term: len(counts) for term, counts in frequencies.items()}
+        self.terms = sorted(frequencies)
+        self.postings = {}
+        for term, counts in frequencies.items():
+            df = len(counts)
+            idf = math.log(1 + (self.document_count - df + 0.5) / (df + 0.5))
+            self.postings[term] = {
+                key: idf * tf * (BM25_K1 + 1)
+                / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[key] / average))
+                for key, tf in counts.items()
+            }
+
+    def expand(self, token: str) -> list:
+        """
+        Get the indexed terms starting with a token.
+
+        Args:
+            token (str): Lowercased token
+
+        Returns:
+            list[str]: Matching terms
+        """
+        start = bisect_left(self.terms, token)
+        stop = start
+        while stop < len(self.terms) and self.terms[stop].startswith(token):
+            stop += 1
+        return self.terms[start:stop]
+
+    def scores(self, search: str) -> dict:
+        """
+        Score the items matching every token of a search.
+
+        Args:
+            search (str): Search text
+
+        Returns:
+            dict[str, float]: Score of each matching item key
+        """
+        scores = None
+        for token in tokenize(search):
+            ### Best weight among the terms the token is a prefix of
+            token_scores = {}
+            for term in self.expand(token):
+                for key, weight in self.postings[term].items():
+                    if weight > token_scores.get(key, 0.0):
+                        token_scores[key] = weight
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    key: score + token_scores[key]
+                    for key, score in scores.items()
+                    if key in token_scores
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+    def rank(self, keys: list, search: str, exclude: set = frozenset()) -> tuple:
+        """
+        Rank item keys by score against a search.
+
+        Args:
+            keys (list[str]): Item keys in catalog order
+            search (str): Search text
+            exclude (set[str], optional): Keys to leave out. Defaults to frozenset().
+
+        Returns:
+            tuple[str]: Matching keys, best first, ties in catalog order
+        """
+        scores = self.scores(search)
+        if not scores:
+            return ()
+        hits = [
+            (-scores[key], position, key)
+            for position, key in enumerate(keys)
+            if key in scores and key not in exclude
+        ]
+        hits.sort()
+        return tuple(key for _, _, key in hits)
+
+
+### Token index over ITEM_RECORDS built at load time
+text_index = TextIndex()
+
+### Scorer shared by the query engines
+fuzzy_scorer = FuzzyScorer(text_index=text_index)
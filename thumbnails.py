@@ -0,0 +1,145 @@
+from PIL import Image
+from rawcache import map_raw, raw_path, write_raw
+from rawcache import is_stale as raw_is_stale
+import argparse
+import time
+import os
+
+### Display sizes used by the UI and the scalings rendered for each
+UI_SIZES = ((30, 30), (20, 20))
+SCALES = (1, 2)
+
+
+def scaled_size(size: tuple, scale: int) -> tuple:
+    """
+    Get the pixel size of a display size at a scaling.
+
+    Args:
+        size (tuple[int, int]): Display size
+        scale (int): Scaling factor
+
+    Returns:
+        tuple[int, int]: Pixel size
+    """
+    return size[0] * scale, size[1] * scale
+
+
+def thumbnail_path(thumb_dir: str, path: str, size: tuple) -> str:
+    """
+    Get the path of the thumbnail of an image at a pixel size.
+
+    Args:
+        thumb_dir (str): Directory holding the thumbnails
+        path (str): Path to the source image
+        size (tuple[int, int]): Pixel size
+
+    Returns:
+        str: Path of the raw RGBA thumbnail
+    """
+    return raw_path(thumb_dir, path, size)
+
+
+def render_thumbnail(image: Image, size: tuple) -> Image:
+    """
+    Resample an image to a pixel size.
+
+    Args:
+        image (Image): PIL Image
+        size (tuple[int, int]): Pixel size
+
+    Returns:
+        Image: RGBA PIL Image
+    """
+    return image.convert("RGBA").resize(size, Image.LANCZOS)
+
+
+def write_thumbnail(thumb_dir: str, path: str, image: Image) -> str:
+    """
+    Store a rendered thumbnail as raw RGBA tagged with its source's stat.
+
+    Args:
+        thumb_dir (str): Directory holding the thumbnails
+        path (str): Path to the source image
+        image (Image): Rendered RGBA thumbnail
+
+    Returns:
+        str: Path of the raw RGBA thumbnail
+    """
+    return write_raw(thumbnail_path(thumb_dir, path, image.size), path, image)
+
+
+def is_stale(thumb_dir: str, path: str, size: tuple) -> bool:
+    """
+    Check whether a thumbnail is missing or older than its source.
+
+    Args:
+        thumb_dir (str): Directory holding the thumbnails
+        path (str): Path to the source image
+        size (tuple[int, int]): Pixel size
+
+    Returns:
+        bool: True if the thumbnail must be rendered again
+    """
+    return raw_is_stale(thumbnail_path(thumb_dir, path, size), path, size)
+
+
+def read_thumbnail(thumb_dir: str, path: str, size: tuple) -> Image:
+    """
+    Memory-map a thumbnail if it is up to date with its source.
+
+    Args:
+        thumb_dir (str): Directory holding the thumbnails
+        path (str): Path to the source image
+        size (tuple[int, int]): Pixel size
+
+    Returns:
+        Image | None: Read-only RGBA PIL Image, None if missing or stale
+    """
+    return map_raw(thumbnail_path(thumb_dir, path, size), path, size)
+
+
+def build_thumbnails(thumb_dir: str, image_dir: str, sizes: tuple = UI_SIZES, scales: tuple = SCALES) -> int:
+    """
+    Render the stale thumbnails of every image under a directory.
+
+    Args:
+        thumb_dir (str): Directory holding the thumbnails
+        image_dir (str): Root of the image assets
+        sizes (tuple[tuple[int, int]], optional): Display sizes. Defaults to UI_SIZES.
+        scales (tuple[int], optional): Scalings. Defaults to SCALES.
+
+    Returns:
+        int: Number of thumbnails rendered
+    """
+    rendered = 0
+    for dirpath, _, filenames in os.walk(image_dir):
+        for name in sorted(filenames):
+            if not name.lower().endswith((".webp", ".png")):
+                continue
+            path = os.path.join(dirpath, name)
+            pixel_sizes = [scaled_size(s, k) for s in sizes for k in scales]
+            stale = [s for s in pixel_sizes if is_stale(thumb_dir, path, s)]
+            if not stale:
+                continue
+            with Image.open(path) as image:
+                image.load()
+                for pixel_size in stale:
+                    write_thumbnail(thumb_dir, path, render_thumbnail(image, pixel_size))
+                    rendered += 1
+    return rendered
+
+
+if __name__ == "__main__":
+    from assets import THUMBNAIL_DIR, IMAGE_DIR
+
+    parser = argparse.ArgumentParser(description="Pre-render UI thumbnails")
+    parser.add_argument("--images", default=IMAGE_DIR, help="image asset root")
+    parser.add_argument("--output", default=THUMBNAIL_DIR, help="thumbnail directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rendered = build_thumbnails(args.output, args.images)
+    print(
+        f"Rendered {rendered} thumbnails into {args.output} "
+        f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )